@@ -2,19 +2,105 @@
 # Zilin Song, 20 AUG 2021
 # 
 
+import numpy
 from MDAnalysis.analysis.hydrogenbonds.hbond_analysis import HydrogenBondAnalysis as HBA
 
-def interatomic_dist(atom_i, atom_j, ):
-    '''Compute the interatomic distance between 2 atoms.
+def pair_dist(positions, pair_i, pair_j, ):
+    '''Compute the distances b/w atom pairs (pair_i[k], pair_j[k]) in one call.
+    positions:  numpy.ndarray of shape (..., n_atoms, 3);
+    return      numpy.ndarray of shape (..., n_pairs).
     '''
-    return	round(
-        ((atom_i.position[0] - atom_j.position[0])**2 + \
-         (atom_i.position[1] - atom_j.position[1])**2 + \
-         (atom_i.position[2] - atom_j.position[2])**2   \
-        ) ** 0.5, 8)
+    _d = positions[..., pair_i, :] - positions[..., pair_j, :]
+    return numpy.round(numpy.sqrt(numpy.sum(_d*_d, axis=-1, )), 8, )
+
+def pairwise_dist(positions, ):
+    '''Compute the condensed upper-triangle distances b/w all atoms in positions (n_atoms, 3).
+    The order is the same with the nested loops over i < j: (0,1), (0,2), ..., (n-2,n-1).
+    '''
+    pair_i, pair_j = numpy.triu_indices(positions.shape[-2], k=1, )
+    return pair_dist(positions, pair_i, pair_j, )
+
+def atom_label(atom, ):
+    '''Label of one atom: resname.resid.name
+    '''
+    return '{0}.{1}.{2}'.format(atom.residue.resname, atom.residue.resid, atom.name, )
+
+def pairwise_labels(atoms, ):
+    '''Labels of the condensed upper-triangle distances, see pairwise_dist().
+    '''
+    _atlbl = [atom_label(atom) for atom in atoms]
+    pair_i, pair_j = numpy.triu_indices(len(_atlbl), k=1, )
+    return ['{0}:{1}'.format(_atlbl[i], _atlbl[j]) for i, j in zip(pair_i, pair_j)]
+
+def pack_pairs(atom_pairs, ):
+    '''Pack a list of atom pairs [(atom_i, atom_j), ...] into a feature selection:
+    (AtomGroup, pair_i, pair_j, labels) where pair_i/pair_j index into the AtomGroup.
+    '''
+    _universe = atom_pairs[0][0].universe
+    atoms  = _universe.atoms[[atom.ix for pair in atom_pairs for atom in pair]]
+    pair_i = numpy.arange(0, 2*len(atom_pairs), 2, )
+    pair_j = pair_i + 1
+    labels = ['{0}:{1}'.format(atom_label(atom_i), atom_label(atom_j)) for atom_i, atom_j in atom_pairs]
+    return atoms, pair_i, pair_j, labels
+
+def replica_indices(mda_universe, atoms, nrep=50, ):
+    '''Map the atoms selected on segid Q1 onto the replica segments Q1 to Q{nrep}.
+    Replica segments are identical copies: each atom sits at the same offset from 
+    the first atom of its segment, which is checked against the resids/names.
+    return numpy.ndarray of shape (nrep, n_atoms) of atom indices.
+    '''
+    if not numpy.all(atoms.segids == 'Q1'):
+        raise ValueError('Atoms not selected on segid Q1: check replica_indices().')
+
+    _segids = mda_universe.segments.segids
+    _segbeg = []
+    for repid in range(1, nrep+1):
+        _seg = mda_universe.segments[_segids == 'Q{0}'.format(str(repid))]
+        if _seg.n_segments != 1:
+            raise ValueError('Found {0} segments of segid Q{1}: check replica_indices().'.format(str(_seg.n_segments), str(repid)))
+        _segbeg.append(_seg.atoms.ix.min())
+    _segbeg = numpy.asarray(_segbeg)
+
+    indices = _segbeg[:, None] + (atoms.ix - _segbeg[0])[None, :]
+
+    # sanity check for aligned replica segments.
+    _all = mda_universe.atoms
+    if indices.max() >= _all.n_atoms                   \
+        or numpy.any(_all.resids[indices] != atoms.resids) \
+        or numpy.any(_all.names[indices]  != atoms.names ):
+        raise ValueError('Replica segments are not aligned to segid Q1: check replica_indices().')
+
+    return indices
+
+def resolve_selection(mda_universe, selection, nrep=50, ):
+    '''Resolve a feature selection on segid Q1 into the atom indices of all nrep replicas.
+    return (indices of shape (nrep, n_atoms), pair_i, pair_j, labels).
+    '''
+    atoms, pair_i, pair_j, labels = selection
+    return replica_indices(mda_universe, atoms, nrep, ), pair_i, pair_j, labels
+
+def indexed_dist(positions, resolved, ):
+    '''Compute the distances of a resolved selection, see resolve_selection().
+    positions:  numpy.ndarray of shape (n_all_atoms, 3);
+    return (numpy.ndarray of shape (nrep, n_pairs), labels).
+    '''
+    indices, pair_i, pair_j, labels = resolved
+    return pair_dist(positions[indices], pair_i, pair_j, ), labels
+
+def selection_dist(selection, ):
+    '''Compute the distances of one feature selection on its own replica.
+    return (numpy.ndarray of shape (n_pairs, ), labels).
+    '''
+    atoms, pair_i, pair_j, labels = selection
+    return pair_dist(atoms.positions, pair_i, pair_j, ), labels
 
 def dist_rx(mda_universe, repid, pathname, ):
-    '''Compute and return all reaction coordinates.
+    '''Compute and return all reaction coordinates, see sel_rx().
+    '''
+    return selection_dist(sel_rx(mda_universe, repid, pathname, ))
+
+def sel_rx(mda_universe, repid, pathname, ):
+    '''Select all reaction coordinates.
     These selections have to be hard-coded, one way or the other.
 
     dx:  sel_atom_i    sel_atom_j
@@ -84,28 +170,24 @@ def dist_rx(mda_universe, repid, pathname, ):
         exit()
 
     _rxcsel = [0, 1, 2, 3, 4, 7, 8, 9, 10, 11, ] if pathname == 'r1ae' else [5, 6, 7, 8, 9, 10, 11, ]
-    _distmat = []
-    _distlbl = []
+    _pairs = []
     for i in _rxcsel:
         group0 = mda_universe.select_atoms(_selbase + atom_i_sel[i])
         group1 = mda_universe.select_atoms(_selbase + atom_j_sel[i])
 
         if group0.n_atoms == 1 and group1.n_atoms == 1:
-            atom_i = group0.atoms[0]
-            atom_j = group1.atoms[0]
-            d = interatomic_dist(atom_i, atom_j, )
-            l =	'{0}.{1}.{2}:{3}.{4}.{5}'.format(
-                atom_i.residue.resname, atom_i.residue.resid, atom_i.name,
-                atom_j.residue.resname, atom_j.residue.resid, atom_j.name,
-            )
-            _distmat.append(d)
-            _distlbl.append(l)
+            _pairs.append((group0.atoms[0], group1.atoms[0], ))
         else: 
             raise ValueError('Pairwise selection retrived more than 1 atoms in each group: Check dist_compute.dist_rx()\n')
             
-    return _distmat, _distlbl
+    return pack_pairs(_pairs)
 
 def dist_rx_toho_cex_mech_valid(mda_universe, repid, pathname, ):
+    '''Compute and return the reaction coordinates, see sel_rx_toho_cex_mech_valid().
+    '''
+    return selection_dist(sel_rx_toho_cex_mech_valid(mda_universe, repid, pathname, ))
+
+def sel_rx_toho_cex_mech_valid(mda_universe, repid, pathname, ):
     '''Used for verifying the mechanism of toho/cex: R2-AE. 
     Reply to reviewer 1.
     '''
@@ -132,26 +214,17 @@ def dist_rx_toho_cex_mech_valid(mda_universe, repid, pathname, ):
     ]
     
     _rxcsel = [0, 1, 2, 3, 4, 5, 6, 7] if pathname == 'r2ae' else [100]
-    _distmat = []
-    _distlbl = []
+    _pairs = []
     for i in _rxcsel:
         group0 = mda_universe.select_atoms(_selbase + atom_i_sel[i])
         group1 = mda_universe.select_atoms(_selbase + atom_j_sel[i])
 
         if group0.n_atoms == 1 and group1.n_atoms == 1:
-            atom_i = group0.atoms[0]
-            atom_j = group1.atoms[0]
-            d = interatomic_dist(atom_i, atom_j, )
-            l =	'{0}.{1}.{2}:{3}.{4}.{5}'.format(
-                atom_i.residue.resname, atom_i.residue.resid, atom_i.name,
-                atom_j.residue.resname, atom_j.residue.resid, atom_j.name,
-            )
-            _distmat.append(d)
-            _distlbl.append(l)
+            _pairs.append((group0.atoms[0], group1.atoms[0], ))
         else: 
             raise ValueError('Pairwise selection retrived more than 1 atoms in each group: Check dist_compute.dist_rx()\n')
             
-    return _distmat, _distlbl
+    return pack_pairs(_pairs)
 
 def qmhvy_selection(mda_universe, repid, ):
     '''Atom selection for heavy atoms in the QM region.
@@ -262,54 +335,45 @@ def dist_hvypw(mda_universe, repid, ):
     '''Compute the pair wise distances b/w heavy atoms.
     '''
     qmhvy_atoms, ligname = qmhvy_selection(mda_universe, repid, )
-    _distmat = []
-    _distlbl = []
-    
-    for i in range(qmhvy_atoms.n_atoms-1):
-        for j in range(i+1, qmhvy_atoms.n_atoms):
-            # all possible (selected atom pairs)
-            atom_i = qmhvy_atoms[i]
-            atom_j = qmhvy_atoms[j]
-            d = interatomic_dist(atom_i, atom_j)
-            l ='{0}.{1}.{2}:{3}.{4}.{5}'.format(
-                atom_i.residue.resname, atom_i.residue.resid, atom_i.name,
-                atom_j.residue.resname, atom_j.residue.resid, atom_j.name,
-            )
-            _distmat.append(d)
-            _distlbl.append(l) 
+    _distmat = pairwise_dist(qmhvy_atoms.positions, )
+    _distlbl = pairwise_labels(qmhvy_atoms, )
     return _distmat, _distlbl
 
+def sel_hvypw(mda_universe, repid, ):
+    '''Select the pair wise distances b/w heavy atoms, see dist_hvypw().
+    '''
+    qmhvy_atoms, ligname = qmhvy_selection(mda_universe, repid, )
+    pair_i, pair_j = numpy.triu_indices(qmhvy_atoms.n_atoms, k=1, )
+    return qmhvy_atoms, pair_i, pair_j, pairwise_labels(qmhvy_atoms, )
+
 def dist_bonds(mda_universe, repid, ):
-    '''Compute and return all chemical bonding distances.
+    '''Compute and return all chemical bonding distances, see sel_bonds().
+    '''
+    return selection_dist(sel_bonds(mda_universe, repid, ))
+
+def bond_index(atoms, ):
+    '''Resolve the chemical bonds within atoms into an index array of shape (n_bonds, 2).
+    Each row (i, j), i < j, indexes into atoms; rows are ordered as the nested loops 
+    over all atom pairs i < j, i.e., the order of the atoms selection.
+    '''
+    # position of each atom in the selection, -1 if not selected.
+    _order = numpy.full(atoms.universe.atoms.n_atoms, -1, )
+    _order[atoms.ix] = numpy.arange(atoms.n_atoms, )
+
+    # atoms.bonds also holds the bonds to unselected atoms.
+    _bonded = _order[atoms.bonds.indices].reshape(-1, 2)
+    _bonded = _bonded[numpy.all(_bonded >= 0, axis=1, )]
+
+    return numpy.unique(numpy.sort(_bonded, axis=1, ), axis=0, )
+
+def sel_bonds(mda_universe, repid, ):
+    '''Select all chemical bonding distances.
     NOTE: the S70-OG -- LIG-C acyl bond is appended manually.
     NOTE: C9/C10 in AMP and C3/C9 in CEX are _always_ unselected.
     '''
     qmhvy_atoms, ligname = qmhvy_selection(mda_universe, repid, )
-    all_bonds = qmhvy_atoms.bonds
-
-    _distmat = []
-    _distlbl = []
-
-    # Determine atoms. Note that this aligns the order of the bond lengths,
-    # according to the order in qmhvy_atoms selection.
-    # NOTE this is an i/o bottle neck, 
-    #      but I don't care since I am using this only once.
-    for i in range(qmhvy_atoms.n_atoms-1):
-        for j in range(i+1, qmhvy_atoms.n_atoms):
-            # all possible (selected) atom pairs
-            atom_i = qmhvy_atoms[i]
-            atom_j = qmhvy_atoms[j]
-
-            for bond in all_bonds:                      # all bond list between selected atoms.
-                if atom_i in bond and atom_j in bond:   # detect if bonded.
-                    d = interatomic_dist(atom_i, atom_j)
-                    l = '{0}.{1}.{2}:{3}.{4}.{5}'.format(
-                        atom_i.residue.resname, atom_i.residue.resid, atom_i.name,
-                        atom_j.residue.resname, atom_j.residue.resid, atom_j.name,
-                    )
-                    _distmat.append(d)
-                    _distlbl.append(l)
-                    
+    bonded = bond_index(qmhvy_atoms, )
+
     # bonds from reaction.
     atom_ser70og = mda_universe.select_atoms(
         'segid Q{0} and (resid  69 and name  OG)'.format(str(repid))
@@ -332,18 +396,30 @@ def dist_bonds(mda_universe, repid, ):
                 str(atom_ligc.n_atoms), str(atom_ligc.residues[0]))
         )
     
-    _distmat.append(interatomic_dist(atom_ser70og.atoms[0], atom_ligc.atoms[0], ))
-    _distlbl.append('{0}.{1}.{2}:{3}.{4}.{5}'.format(
-                        atom_ser70og.atoms[0].residue.resname, 
-                        atom_ser70og.atoms[0].residue.resid, 
-                        atom_ser70og.atoms[0].name,
-                        atom_ligc.atoms[0].residue.resname, 
-                        atom_ligc.atoms[0].residue.resid, 
-                        atom_ligc.atoms[0].name,
-                        )
-                    )
+    # the acyl bond is appended as the last pair.
+    atoms  = qmhvy_atoms + atom_ser70og + atom_ligc
+    pair_i = numpy.append(bonded[:, 0], qmhvy_atoms.n_atoms  , )
+    pair_j = numpy.append(bonded[:, 1], qmhvy_atoms.n_atoms+1, )
+    labels = ['{0}:{1}'.format(atom_label(atoms[i]), atom_label(atoms[j])) for i, j in zip(pair_i, pair_j)]
 
-    return _distmat, _distlbl
+    return atoms, pair_i, pair_j, labels
+
+def hbond_labels(mda_universe, hbonds, ):
+    '''Labels of the HBA results hbonds, without repeated (or reversed) atom pairs.
+    NOTE format  Donor:Acceptor
+    '''
+    labels = {}     # unordered atom pair -> label, ordered as detected.
+    for hb in hbonds:
+        donor_atom = mda_universe.atoms[int(hb[1])]
+        accep_atom = mda_universe.atoms[int(hb[3])]
+
+        da_l = '{0}:{1}'.format(atom_label(donor_atom), atom_label(accep_atom), )
+        _key = tuple(sorted(da_l.split(':')))
+
+        if not _key in labels:      # filter repeated entries.
+            labels[_key] = da_l
+    
+    return list(labels.values())
 
 def hbond_detect(mda_universe, repid, ):
     '''Detects all hbonds on that replica, defined as Donor-Acceptor distances.
@@ -412,26 +488,15 @@ def hbond_detect(mda_universe, repid, ):
     hba.run()
     results = hba.hbonds
 
-    # Labels of Hbonds.
-    ## NOTE format  Donor:Acceptor
-    labels = []
-    for hb in results:
-        donor_atom = mda_universe.atoms[int(hb[1])]
-        accep_atom = mda_universe.atoms[int(hb[3])]
+    return hbond_labels(mda_universe, results, )
 
-        da_l = '{0}.{1}.{2}:{3}.{4}.{5}'.format(
-                donor_atom.residue.resname, donor_atom.residue.resid, donor_atom.name,
-                accep_atom.residue.resname, accep_atom.residue.resid, accep_atom.name,
-            )
-        ad_l = '{0}.{1}.{2}:{3}.{4}.{5}'.format(
-                accep_atom.residue.resname, accep_atom.residue.resid, accep_atom.name,
-                donor_atom.residue.resname, donor_atom.residue.resid, donor_atom.name,
-            )
-
-        if not (da_l in labels or ad_l in labels):      # filter repeated entries.
-            labels.append(da_l)
-        
-    return labels
+def hbond_detect_path(mda_universe, nrep=50, ):
+    '''Detects all hbonds on all nrep replicas of a path, see hbond_detect().
+    NOTE one HBA run per replica: the replicas of a path overlap in space, 
+         such that one HBA run over all replicas scans ~nrep**2 times the D-H-A candidates.
+    return a list of nrep lists of labels.
+    '''
+    return [hbond_detect(mda_universe, repid, ) for repid in range(1, nrep+1)]
 
 def unify_hbond_labels(amp_labels, cex_labels):
     '''Here return unified labels for replica-wise feature extraction. 
@@ -524,8 +589,12 @@ def unify_hbond_labels(amp_labels, cex_labels):
 def dist_hbonds(mda_universe, repid, da_labels, ):
     '''Compute and return all inter-donor/acceptor pairwise distances specified in da_labels
     '''
-    _distmat = []
-    _distlbl = []
+    return selection_dist(sel_hbonds(mda_universe, repid, da_labels, ))
+
+def sel_hbonds(mda_universe, repid, da_labels, ):
+    '''Select all inter-donor/acceptor pairwise distances specified in da_labels
+    '''
+    _pairs = []
 
     for pairlabel in da_labels:
         atomlabels = pairlabel.split(':')
@@ -540,15 +609,10 @@ def dist_hbonds(mda_universe, repid, da_labels, ):
         )
 
         if group0.n_atoms == 1 and group1.n_atoms == 1:
-
-            atom_i = group0.atoms[0]
-            atom_j = group1.atoms[0]
-            d = interatomic_dist(atom_i, atom_j, )
-
-            _distmat.append(d)
-            _distlbl.append(pairlabel)
+            _pairs.append((group0.atoms[0], group1.atoms[0], ))
 
         else: 
             raise ValueError('Pairwise selection retrived more than 1 atoms in each group: Check dist_compute.dist_hbonds()\n')
 
-    return _distmat, _distlbl
+    atoms, pair_i, pair_j, labels = pack_pairs(_pairs)
+    return atoms, pair_i, pair_j, list(da_labels)
@@ -2,8 +2,12 @@
 # Zilin Song, 20 AUG 2021
 # 
 
+import os, hashlib, numpy
 import MDAnalysis as mda
 
+_psf_hashes = {}    # psf file -> content hash, per process.
+_topologies = {}    # psf content hash -> topology only Universe, the last one per process.
+
 def basedir():
     '''An ugly way to put a global var.
     '''
@@ -58,8 +62,14 @@ def enerdirs(sysname, pathname, theoryname, ):
     return _fw_edir, _bw_edir, _fw_barrierdir, _bw_barrierdir
 
 def load_path(sysname, pathname, whichdirection, pathid, ):
+    '''Load and return a MDAnalysis.Universe instance of the conformations, see path_files().
+    '''
+    _psfdir, _cordir = path_files(sysname, pathname, whichdirection, pathid, )
+
+    return mda.Universe(_psfdir, _cordir, topology_format='PSF', format='CRD', )
+
+def path_files(sysname, pathname, whichdirection, pathid, ):
     '''Build the directories to the conformations; 
-    Load and return a MDAnalysis.Universe instance.
     
     sysname: 		toho_amp, toho_cex;
     pathname:		r1ae, r2ae;
@@ -71,7 +81,7 @@ def load_path(sysname, pathname, whichdirection, pathid, ):
     /users/zilins/scratch/2.proj_toho2lig_acy/1.sampling/4.toho_cex .r2/8.    dftb.paths  /path_opt/toho_cex.path_f52.psf
     /users/zilins/scratch/2.proj_toho2lig_acy/1.sampling/5.toho_cex. ae/8b.r2.dftb.paths  /path_opt/toho_cex.path_f65.cor
 
-    Will return a MDAnalysis.Universe object of the path.
+    Will return 2 str: psfdir & cordir
     '''
 
     # sysid:    number before sysname;
@@ -102,4 +112,141 @@ def load_path(sysname, pathname, whichdirection, pathid, ):
     _psfdir = '{0}/{1}.{2}.{3}/path_opt/{2}.path_f{4}.psf'.format(_bdir, _sysid, sysname, _pathname, str(pathid))
     _cordir = '{0}/{1}.{2}.{3}/path_opt/{2}.path_f{4}.cor'.format(_bdir, _sysid, sysname, _pathname, str(pathid))
 
-    return mda.Universe(_psfdir, _cordir, topology_format='PSF', format='CRD', )
+    return _psfdir, _cordir
+
+def psf_hash(psfdir, ):
+    '''The content hash of a PSF file.
+    '''
+    if not psfdir in _psf_hashes:
+        with open(psfdir, 'rb') as fi:
+            _psf_hashes[psfdir] = hashlib.sha1(fi.read()).hexdigest()
+    return _psf_hashes[psfdir]
+
+def load_topology(psfdir, ):
+    '''Load a topology only MDAnalysis.Universe from a PSF file.
+    The PSF files of one direction share one topology, which is parsed once and reused.
+    '''
+    _hash = psf_hash(psfdir, )
+    if not _hash in _topologies:
+        _topologies.clear()
+        _topologies[_hash] = mda.Universe(psfdir, topology_format='PSF', )
+    return _topologies[_hash]
+
+def qm_resids():
+    '''Resids of the residues touched by the feature definitions in dist_compute.
+    '''
+    return [69, 72, 129, 165, 169, 233, 234, 236, 285, 433, ]
+
+def read_crd(cordir, resids, segprefix='Q', ):
+    '''Read only the atoms of resids on the segids segprefix* from a CHARMM CRD file,
+    the other lines are skipped before the coordinates are parsed.
+    Both the standard and the EXT CRD formats are supported (fixed columns).
+
+    Will return (ix, positions of shape (n_sel, 3), names) of the selected atoms.
+    '''
+    _resids = set([str(r) for r in resids])
+
+    ix, positions, names = [], [], []
+    with open(cordir, 'r') as fi:
+        line = fi.readline()
+        while line.startswith('*'):     # title lines.
+            line = fi.readline()
+        
+        # column slices: atomno, name, x, y, z, segid, resid.
+        if 'EXT' in line:
+            _cols = (slice(0, 10), slice(32, 40), slice( 40,  60), slice( 60,  80), slice( 80, 100), slice(102, 110), slice(112, 120), )
+        else:
+            _cols = (slice(0,  5), slice(16, 20), slice( 20,  30), slice( 30,  40), slice( 40,  50), slice( 51,  55), slice( 56,  60), )
+        
+        for line in fi:
+            if line[_cols[5]].strip().startswith(segprefix) and line[_cols[6]].strip() in _resids:
+                ix.append(int(line[_cols[0]]) - 1)
+                names.append(line[_cols[1]].strip())
+                positions.append((float(line[_cols[2]]), float(line[_cols[3]]), float(line[_cols[4]]), ))
+    
+    return numpy.asarray(ix, dtype=int, ), numpy.asarray(positions, dtype=numpy.float32, ).reshape(-1, 3), numpy.asarray(names, )
+
+def load_path_slim(sysname, pathname, whichdirection, pathid, ):
+    '''Load the topology and only the QM-region coordinates (qm_resids() on the replica segments) of one path.
+    The topology is shared by all PSF files of one direction and parsed once, see load_topology().
+
+    Will return (MDAnalysis.Universe, positions of shape (n_atoms, 3)):
+    the Universe holds the topology only and the unread atoms are numpy.nan .
+    '''
+    _psfdir, _cordir = path_files(sysname, pathname, whichdirection, pathid, )
+    u = load_topology(_psfdir, )
+    ix, xyz, names = read_crd(_cordir, qm_resids(), )
+
+    # sanity check: the CRD should be aligned with the PSF.
+    if ix.shape[0] == 0 or numpy.any(u.atoms.names[ix] != names):
+        raise ValueError('CRD atoms not aligned with the PSF topology: check {0}.'.format(_cordir))
+
+    positions = numpy.full((u.atoms.n_atoms, 3, ), numpy.nan, dtype=numpy.float32, )
+    positions[ix] = xyz
+    return u, positions
+
+def coordcache_dir():
+    '''Directory of the binary coordinate cache.
+    '''
+    return './coordcache'
+
+def coordcache_files(sysname, pathname, whichdirection, pathid, ):
+    '''Build the directories to the cached coordinates of one path:
+    {psf hash}.ix.npy:                                  indices of the cached atoms, once per topology;
+    {sysname}.{pathname}.{whichdirection}.path{pathid}.{psf hash}.xyz.npy:   coordinates of the cached atoms.
+
+    Will return 2 str: ixdir & xyzdir
+    '''
+    _psfdir, _cordir = path_files(sysname, pathname, whichdirection, pathid, )
+    _hash = psf_hash(_psfdir, )[:16]
+
+    _ixdir  = '{0}/{1}.ix.npy'.format(coordcache_dir(), _hash, )
+    _xyzdir = '{0}/{1}.{2}.{3}.path{4}.{5}.xyz.npy'.format(coordcache_dir(), sysname, pathname, whichdirection, str(pathid), _hash, )
+
+    return _ixdir, _xyzdir
+
+def _atomic_save(npydir, arr, ):
+    '''numpy.save through a temporary file: concurrent workers may share the cache.
+    '''
+    _tmpdir = '{0}.{1}.tmp.npy'.format(npydir, str(os.getpid()), )
+    numpy.save(_tmpdir, arr, )
+    os.replace(_tmpdir, npydir, )
+
+def cache_path(sysname, pathname, whichdirection, pathid, mda_universe=None, segsel='segid Q*', ):
+    '''Convert the coordinates of the atoms in segsel (the replica segments) of one path 
+    to the binary coordinate cache, see coordcache_files().
+    mda_universe: the loaded path, loaded from the text PSF/CRD if None.
+    '''
+    u = load_path(sysname, pathname, whichdirection, pathid, ) if mda_universe is None else mda_universe
+    _ixdir, _xyzdir = coordcache_files(sysname, pathname, whichdirection, pathid, )
+
+    os.makedirs(coordcache_dir(), exist_ok=True, )
+    if not os.path.isfile(_ixdir):
+        _atomic_save(_ixdir, u.select_atoms(segsel).ix, )
+
+    _atomic_save(_xyzdir, u.trajectory.ts.positions[numpy.load(_ixdir)], )
+
+def load_path_positions(sysname, pathname, whichdirection, pathid, slim=False, ):
+    '''Load the topology and the coordinates of one path.
+    The coordinates are read from the binary coordinate cache if it is fresh (newer than the CRD file);
+    otherwise the text PSF/CRD files are loaded and converted to the cache, 
+    or, if slim, only the QM-region atoms are read from the CRD file, see load_path_slim().
+
+    Will return (MDAnalysis.Universe, positions of shape (n_atoms, 3)): 
+    from the cache the Universe holds the topology only and the uncached atoms are numpy.nan .
+    '''
+    _psfdir, _cordir = path_files(sysname, pathname, whichdirection, pathid, )
+    _ixdir, _xyzdir  = coordcache_files(sysname, pathname, whichdirection, pathid, )
+
+    if os.path.isfile(_ixdir) and os.path.isfile(_xyzdir) and os.path.getmtime(_xyzdir) >= os.path.getmtime(_cordir):
+        u = load_topology(_psfdir, )
+        positions = numpy.full((u.atoms.n_atoms, 3, ), numpy.nan, dtype=numpy.float32, )
+        positions[numpy.load(_ixdir)] = numpy.load(_xyzdir, mmap_mode='r', )
+        return u, positions
+
+    if slim:
+        return load_path_slim(sysname, pathname, whichdirection, pathid, )
+
+    u = load_path(sysname, pathname, whichdirection, pathid, )
+    cache_path(sysname, pathname, whichdirection, pathid, mda_universe=u, )
+    return u, u.trajectory.ts.positions
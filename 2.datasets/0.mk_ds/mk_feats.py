@@ -0,0 +1,181 @@
+# Single-pass feature extraction: each path file is loaded once and 
+# all registered feature families are extracted from it.
+# 
+
+import os, sys, json, iomisc, numpy, dist_compute, selcache, scheduler
+
+def feature_families(sysname, pathname, hbond_labels=None, ):
+    '''The registered feature families of one dataset: 
+        {family: (selector, selector arguments, output prefix), }
+    The outputs are {output prefix}_distmat.npy and {output prefix}_distlabel.npy.
+    hbonds are registered only if the unified hbond_labels are given, see mk_hbonds.get_hbond_labels().
+    '''
+    families = {
+        'rxc':          (dist_compute.sel_rx,    (pathname, ), './rawds_rxc/{0}.{1}.rxc'.format(sysname, pathname, ), ), 
+        'chembonds':    (dist_compute.sel_bonds, (         ), './rawds_chembonds/{0}.{1}.chembonds'.format(sysname, pathname, ), ), 
+        'hvypw':        (dist_compute.sel_hvypw, (         ), './rawds_hvypw/{0}.{1}.hvypw'.format(sysname, pathname, ), ), 
+    }
+
+    if not hbond_labels is None:
+        families['hbonds'] = (dist_compute.sel_hbonds, (hbond_labels, ), './rawds_hbonds/{0}.{1}.hbonds'.format(sysname, pathname, ), )
+
+    # Used for verifying the mechanism of toho/cex: R2-AE. Reply to reviewer 1.
+    if sysname == 'toho_cex' and pathname == 'r2ae':
+        families['rxc_mech_valid'] = (dist_compute.sel_rx_toho_cex_mech_valid, (pathname, ), './valid_toho_cex_r2ae/{0}.{1}.rxc'.format(sysname, pathname, ), )
+
+    return families
+
+def extract_path(sysname, pathname, direction, pathid, families, slim=False, nrep=50, ):
+    '''Load one path (from the binary coordinate cache if fresh) and extract all feature families: one scheduler unit.
+    families: {family: (selector, selector arguments, output prefix), } from feature_families().
+    slim:     read only the QM-region atoms from the CRD file, see iomisc.load_path_slim().
+    return {family: (distmat of shape (nrep, n_pairs), label id), }, see selcache.path_feats().
+    '''
+    u, positions = iomisc.load_path_positions(sysname, pathname, direction, pathid, slim, )
+    u_label = '{0}.{1}.{2}.path{3}'.format(sysname, pathname, direction, str(pathid), ) 
+    print(u_label, flush=True, )
+
+    return {
+        family: selcache.path_feats(u, selector, args, nrep, positions, ) for family, (selector, args, _, ) in families.items()
+    }
+
+def check_label(labelids, ):
+    '''Check for consistent labeling: all paths should share one label table.
+    '''
+    for i in range(len(labelids)):
+        if labelids[0] != labelids[i]:
+            raise ValueError('Inequal dist label table detected: {0} vs {1} @ path{2}\n'.format(labelids[0], labelids[i], str(i), ))
+
+def unit_label(unit, ):
+    '''Label of a scheduler unit (sysname, pathname, direction, pathid, ...).
+    '''
+    return '{0}.{1}.{2}.path{3}'.format(unit[0], unit[1], unit[2], str(unit[3]), )
+
+def load_manifest(outprefix, ):
+    '''The completion manifest of {outprefix}_distmat.npy: 
+        {'labelid': label id, 'units': {unit label: [first row, last row + 1], }, }
+    listing the path units already written to the output, empty if not started.
+    Remove {outprefix}_distmat.manifest to extract from scratch.
+    '''
+    _manifest = '{0}_distmat.manifest'.format(outprefix, )
+
+    if not (os.path.isfile(_manifest) and os.path.isfile('{0}_distmat.npy'.format(outprefix, ))):
+        return {'labelid': None, 'units': {}, }
+    
+    with open(_manifest, 'r') as fi:
+        return json.load(fi)
+
+def save_manifest(outprefix, manifest, ):
+    '''Write the completion manifest of {outprefix}_distmat.npy, see load_manifest().
+    '''
+    _manifest = '{0}_distmat.manifest'.format(outprefix, )
+    with open('{0}.tmp'.format(_manifest), 'w') as fo:
+        json.dump(manifest, fo, )
+    os.replace('{0}.tmp'.format(_manifest), _manifest, )
+
+def open_distmat(outprefix, shape, dtype, manifest, ):
+    '''The preallocated output {outprefix}_distmat.npy of shape, reopened if present with the same shape.
+    A present output of another shape or dtype is recreated only if its manifest records no paths.
+    '''
+    _distdir = '{0}_distmat.npy'.format(outprefix, )
+
+    if os.path.isfile(_distdir):
+        distmat = numpy.load(_distdir, mmap_mode='r+', )
+        if distmat.shape == shape and distmat.dtype == dtype:
+            return distmat
+        del distmat
+
+        if len(manifest['units']) != 0:
+            raise ValueError('{0} of another shape or dtype than {1} {2} has completed paths in its manifest: '
+                             'remove {3}_distmat.manifest to extract from scratch.'.format(_distdir, shape, dtype, outprefix, ))
+
+    os.makedirs(os.path.dirname(outprefix), exist_ok=True, )
+    return numpy.lib.format.open_memmap(_distdir, mode='w+', dtype=dtype, shape=shape, )
+
+def write_path(families, npaths, pathidx, unit, path_result, outputs, manifests, ):
+    '''Write the extract_path() outputs of the unit, the pathidx-th path (of npaths), of each family into 
+    the rows [pathidx*nrep, (pathidx+1)*nrep) of its output, then record the unit in the manifest.
+    outputs:   {family: distmat memmap}, opened on the first written path.
+    manifests: {family: manifest}, see load_manifest().
+    '''
+    for family, (_distmat, _labelid, ) in path_result.items():
+        outprefix = families[family][2]
+        nrep = _distmat.shape[0]
+
+        # consistent labeling: all paths share one label table.
+        _prevlabelid = manifests[family]['labelid']
+        check_label([_labelid, ] if _prevlabelid is None else [_prevlabelid, _labelid, ])
+
+        if not family in outputs:
+            outputs[family] = open_distmat(outprefix, (npaths*nrep, _distmat.shape[1], ), _distmat.dtype, manifests[family], )
+
+        outputs[family][pathidx*nrep:(pathidx+1)*nrep] = _distmat
+        outputs[family].flush()
+
+        manifests[family]['labelid'] = _labelid
+        manifests[family]['units'][unit_label(unit, )] = [pathidx*nrep, (pathidx+1)*nrep, ]
+        save_manifest(outprefix, manifests[family], )
+
+def process_feats(sysname, pathname, families, ):
+    '''Finish all feature families: save the labels of the completed outputs.
+    '''
+    units = scheduler.path_units(sysname, pathname, )
+
+    for family, (_, _, outprefix, ) in families.items():
+        manifest = load_manifest(outprefix, )
+        _missing = [unit_label(unit, ) for unit in units if not unit_label(unit, ) in manifest['units']]
+        if len(_missing) != 0:
+            raise ValueError('{0}_distmat.npy misses {1}/{2} paths, {3}...: check process_feats().'.format(
+                outprefix, len(_missing), len(units), _missing[0], ))
+
+        distmat = numpy.load('{0}_distmat.npy'.format(outprefix), mmap_mode='r', )
+        print('Finished dist extraction: {0}.{1}.{2}_distmat.shape = {3}.\nLabels checked.\nDONE.'.format(sysname, pathname, family, distmat.shape))
+        numpy.save('{0}_distlabel.npy'.format(outprefix), selcache.load_labels(manifest['labelid']), )
+
+def main(which=None, nproc=None, slim=False, ):
+    '''Extract the feature families in which (all registered families if None) in one pass.
+    The paths are written to the outputs as they complete and recorded in the manifests, 
+    a relaunch extracts only the families missing on each path, see load_manifest().
+    slim: read only the QM-region atoms from the CRD files, see iomisc.load_path_slim().
+    '''
+    if which is None or 'hbonds' in which:
+        import mk_hbonds
+        amp_lbl, cex_lbl = mk_hbonds.get_hbond_labels()
+    else:
+        amp_lbl, cex_lbl = None, None
+
+    datasets = []
+    for sysname, hbond_labels in [('toho_amp', amp_lbl, ), ('toho_cex', cex_lbl, ), ]:
+        for pathname in ['r1ae', 'r2ae', ]:
+            families = feature_families(sysname, pathname, hbond_labels, )
+            families = {f: families[f] for f in families if which is None or f in which}
+            
+            if len(families) != 0:
+                datasets.append((sysname, pathname, families, ))
+
+    # the missing path units of all datasets share one pool.
+    manifests = {}  # (sysname, pathname) -> {family: manifest}
+    jobs = []       # (dataset, path index, number of paths, unit with the missing families)
+    for ds in datasets:
+        _manifests = manifests.setdefault((ds[0], ds[1], ), {f: load_manifest(ds[2][f][2], ) for f in ds[2]}, )
+        units = scheduler.path_units(ds[0], ds[1], )
+
+        for pathidx, unit in enumerate(units):
+            _missing = {f: ds[2][f] for f in ds[2] if not unit_label(unit, ) in _manifests[f]['units']}
+            if len(_missing) != 0:
+                jobs.append((ds, pathidx, len(units), unit + (_missing, slim, ), ))
+
+    print('Extracting {0} path units.'.format(len(jobs), ), flush=True, )
+
+    outputs = {}    # (sysname, pathname) -> {family: distmat memmap}
+    for jobidx, path_result in scheduler.imap_units(extract_path, [job[3] for job in jobs], nproc, ):
+        ds, pathidx, npaths, unit = jobs[jobidx]
+        write_path(ds[2], npaths, pathidx, unit, path_result, outputs.setdefault((ds[0], ds[1], ), {}), manifests[(ds[0], ds[1], )], )
+
+    for sysname, pathname, families, in datasets:
+        process_feats(sysname, pathname, families, )
+
+if __name__ == "__main__":
+    # python mk_feats.py [nproc] [family ...] [--slim]
+    which = [a for a in sys.argv[2:] if not a.startswith('--')]
+    main(which if len(which) != 0 else None, scheduler.argv_nproc(), '--slim' in sys.argv, )
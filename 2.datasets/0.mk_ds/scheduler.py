@@ -0,0 +1,83 @@
+# Parallel scheduler for the feature extraction over path files.
+# Work is split by (sysname, pathname, direction, pathid) across one process pool.
+# 
+
+import os, sys, multiprocessing
+
+def path_units(sysname, pathname, directions=('fw', 'bw', ), pathids=range(1, 101), ):
+    '''All (sysname, pathname, direction, pathid) units of one dataset, 
+    in the order of the rows in the datasets: fw paths 1-100, then bw paths 1-100.
+    '''
+    return [(sysname, pathname, d, pid, ) for d in directions for pid in pathids]
+
+def default_nproc():
+    '''Number of cores available to this process (respects the SLURM cpu binding).
+    '''
+    return len(os.sched_getaffinity(0))
+
+def argv_nproc(argidx=1, ):
+    '''Number of worker processes from sys.argv[argidx], if given.
+    '''
+    return int(sys.argv[argidx]) if len(sys.argv) > argidx else None
+
+def _call_unit(func_unit, ):
+    '''Unpack one (func, unit) for the pool workers.
+    '''
+    func, unit = func_unit
+    return func(*unit)
+
+def run_units(func, units, nproc=None, ):
+    '''Run func(*unit) for all units across a pool of nproc workers.
+    return the results in the order of units.
+    '''
+    pool = multiprocessing.Pool(nproc or default_nproc(), )
+    try:
+        results = pool.map(_call_unit, [(func, unit, ) for unit in units], chunksize=1, )
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    
+    return results
+
+def _call_indexed_unit(index_func_unit, ):
+    '''Unpack one (index, func, unit) for the pool workers, return (index, result).
+    '''
+    index, func, unit = index_func_unit
+    return index, func(*unit)
+
+def imap_units(func, units, nproc=None, ):
+    '''Same as run_units(), but yield (index in units, result) one by one as soon as 
+    each unit completes, in the order of completion.
+    '''
+    pool = multiprocessing.Pool(nproc or default_nproc(), )
+    try:
+        for index_result in pool.imap_unordered(
+                _call_indexed_unit, [(index, func, unit, ) for index, unit in enumerate(units)], chunksize=1, ):
+            yield index_result
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def run_datasets(func, datasets, nproc=None, pathids=range(1, 101), ):
+    '''Run func(sysname, pathname, direction, pathid, *args) for all path units (pathids) of all 
+    datasets [(sysname, pathname, *args), ...] in one pool of nproc workers.
+    return a list of the results of each dataset, each in the order of path_units().
+    '''
+    units = [
+        [unit + tuple(ds[2:]) for unit in path_units(ds[0], ds[1], pathids=pathids, )] for ds in datasets
+    ]
+    results = run_units(func, [unit for ds_units in units for unit in ds_units], nproc, )
+
+    ds_results = []
+    offset = 0
+    for ds_units in units:
+        ds_results.append(results[offset:offset+len(ds_units)])
+        offset += len(ds_units)
+
+    return ds_results
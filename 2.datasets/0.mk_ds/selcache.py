@@ -0,0 +1,113 @@
+# Persistent atom-index cache for the feature selections in dist_compute.
+# All PSF files in one direction share the same topology, so the selections 
+# are parsed once per topology and the resolved atom indices are kept on disk.
+# 
+
+import os, json, hashlib, inspect, numpy, iomisc, dist_compute
+
+_selections = {}    # cache file -> (resolved selection, label id), per process.
+_srchashes  = {}    # (selector module, args) -> hash of the selector arguments and source, per process.
+
+def cachedir():
+    '''Directory of the cached selections.
+    '''
+    return './selcache'
+
+def ligand_name(mda_universe, segid='Q1', ):
+    '''Resname of the ligand (resid 285) on segid, read from the topology attributes.
+    '''
+    _res   = mda_universe.residues
+    _names = numpy.unique(_res.resnames[(_res.segids == segid) & (_res.resids == 285)])
+    if _names.shape[0] != 1 or (not _names[0] in ['AMP', 'CEX', ]):
+        raise ValueError('LIG resname {0} on segid {1}: check ligand_name().'.format(str(_names), segid))
+    return str(_names[0])
+
+def cache_key(mda_universe, selector, args=(), segid='Q1', nrep=50, ):
+    '''Cache key of one selection: 
+        psf content hash, segid, ligand name, selector name, nrep and a hash of the 
+        selector arguments and the source of the selector module.
+    '''
+    _args = json.dumps(list(args), default=list, )
+    if not (selector.__module__, _args, ) in _srchashes:
+        _srchashes[(selector.__module__, _args, )] = hashlib.sha1(
+            (_args + inspect.getsource(inspect.getmodule(selector))).encode()
+        ).hexdigest()
+    _srchash = _srchashes[(selector.__module__, _args, )]
+
+    return '{0}.{1}.{2}.{3}.nrep{4}.{5}'.format(
+        iomisc.psf_hash(mda_universe.filename, )[:16], segid, ligand_name(mda_universe, segid, ), 
+        selector.__name__, str(nrep), _srchash[:8], 
+    )
+
+def load_selection(mda_universe, selector, args=(), nrep=50, ):
+    '''Return the resolved selection (indices, pair_i, pair_j, labels) of selector(mda_universe, 1, *args), 
+    see dist_compute.resolve_selection(), and the label id of the selection, see register_labels().
+    Read from the cache if present, otherwise select and write the cache.
+    The label table is registered once per cache key, i.e., per PSF hash, and not hashed again per path.
+    '''
+    _cachefile = '{0}/{1}.json'.format(cachedir(), cache_key(mda_universe, selector, args, nrep=nrep, ))
+
+    if not _cachefile in _selections:
+
+        if os.path.isfile(_cachefile):
+            with open(_cachefile, 'r') as fi:
+                _entry = json.load(fi)
+            resolved = (numpy.asarray(_entry['indices']), numpy.asarray(_entry['pair_i']), 
+                        numpy.asarray(_entry['pair_j']), _entry['labels'], )
+
+        else:
+            selection = selector(mda_universe, 1, *args)
+            resolved  = dist_compute.resolve_selection(mda_universe, selection, nrep, )
+            
+            # write to a temporary file first: concurrent workers may share the cache.
+            os.makedirs(cachedir(), exist_ok=True, )
+            with open('{0}.{1}.tmp'.format(_cachefile, str(os.getpid())), 'w') as fo:
+                json.dump({
+                    'indices':  resolved[0].tolist(), 
+                    'pair_i':   resolved[1].tolist(), 
+                    'pair_j':   resolved[2].tolist(), 
+                    'labels':   list(resolved[3]), 
+                }, fo, )
+            os.replace('{0}.{1}.tmp'.format(_cachefile, str(os.getpid())), _cachefile, )
+            
+        _selections[_cachefile] = (resolved, register_labels(resolved[3], ), )
+    
+    return _selections[_cachefile]
+
+def label_id(labels, ):
+    '''Id of a label table: content hash of the ordered labels.
+    '''
+    return hashlib.sha1('\n'.join(labels).encode()).hexdigest()[:16]
+
+def register_labels(labels, ):
+    '''Store the label table {cachedir}/{label id}.labels.npy once, 
+    feature k of any distmat with this label id is labels[k].
+    return the label id.
+    '''
+    _id = label_id(labels, )
+    _labelfile = '{0}/{1}.labels.npy'.format(cachedir(), _id, )
+
+    if not os.path.isfile(_labelfile):
+        os.makedirs(cachedir(), exist_ok=True, )
+        _tmp = '{0}.{1}.tmp.npy'.format(_labelfile[:-len('.npy')], str(os.getpid()))
+        numpy.save(_tmp, numpy.asarray(labels, ), )
+        os.replace(_tmp, _labelfile, )
+
+    return _id
+
+def load_labels(labelid, ):
+    '''Load the label table of labelid, see register_labels().
+    '''
+    return numpy.load('{0}/{1}.labels.npy'.format(cachedir(), labelid, ))
+
+def path_feats(mda_universe, selector, args=(), nrep=50, positions=None, ):
+    '''Compute the distances of selector(mda_universe, 1, *args) on all nrep replicas of a path.
+    positions: coordinates of all atoms (n_atoms, 3), from mda_universe if None, 
+               see iomisc.load_path_positions().
+    return (numpy.ndarray of shape (nrep, n_pairs), label id).
+    '''
+    resolved, labelid = load_selection(mda_universe, selector, args, nrep, )
+    distmat, _ = dist_compute.indexed_dist(
+        mda_universe.trajectory.ts.positions if positions is None else positions, resolved, 
+    )
+    return distmat, labelid
@@ -4,20 +4,29 @@
 
 import numpy, iomisc
 
-def make_relative_ds(ds, ref_offset, nrep=50):
+def make_relative_ds(ds, ref_offset, nrep=50, out=None, ):
     '''Process the ds into relative dist data.
     ds_elabels      -> labels of replica energies.
     ref_offset = 47 -> last replica (AE) as reference.
+    out             -> array (or memmap) of ds.shape for the relative data, 
+                       could be ds itself (in place), a new array if None.
     '''
-    relative_ds = []
-    for rid in range(ds.shape[0]):
-        if rid % nrep == 0:
-            refdistrow = ds[ rid + ref_offset ].copy()    # use Last replica (AE) as the reference.
-        # refdistrow = ds[ref_offset].copy()              # use one replica as the global reference.
-        distrow = numpy.round_(ds[rid] - refdistrow, 8, )
-        relative_ds.append(distrow)
+    _ds  = ds.reshape((-1, nrep, ) + ds.shape[1:])               # (npath, nrep, nfeat) or (npath, nrep) for ener.
+    _ref = _ds[:, ref_offset:ref_offset+1, ...].copy()          # use Last replica (AE) as the reference.
+    # _ref = _ds[0:1, ref_offset:ref_offset+1, ...].copy()      # use one replica as the global reference.
 
-    return numpy.asarray(relative_ds)
+    out  = numpy.empty(ds.shape, dtype=ds.dtype, ) if out is None else out
+    if out.shape != ds.shape: 
+        raise ValueError('out of shape {0} for ds of shape {1}: check make_relative_ds().'.format(out.shape, ds.shape, ))
+    
+    # the results are written through the reshaped view of out: a copy would silently drop them.
+    _out = out.reshape(_ds.shape)
+    if not numpy.shares_memory(_out, out): 
+        raise ValueError('out could not be reshaped without a copy: check make_relative_ds().')
+    numpy.subtract(_ds, _ref, out=_out, )
+    numpy.round(_out, 8, out=_out, )
+
+    return out
 
 def merge_ds(sysname, pathname, ):
     '''Merge the x and y datasets. 
@@ -26,7 +35,7 @@ def merge_ds(sysname, pathname, ):
     # outputs
     y, ylbl = iomisc.load_raw_ds(sysname, pathname, 'ener', )
     ref_offset = 49  # last replica is ref 
-    rel_y = make_relative_ds(y, ref_offset)
+    rel_y = make_relative_ds(y, ref_offset, out=y, )
 
     numpy.save('./ener_ds/{0}.{1}.rel_y.npy'.format(sysname, pathname, ), rel_y)
     numpy.save('./ener_ds/{0}.{1}.rel_ylbl.npy'.format(sysname, pathname, ), ylbl)
@@ -38,13 +47,15 @@ def merge_ds(sysname, pathname, ):
     # merge features
     x     = numpy.concatenate((   x_rc,    x_cb,    x_hb, ), axis=1, )
     xlbl  = numpy.concatenate((xlbl_rc, xlbl_cb, xlbl_hb, ), axis=0, )
-    rel_x = make_relative_ds(x, ref_offset)
+    numpy.save('./raw_ds/{0}.{1}.raw_x.npy'.format(sysname,pathname,), x)
+    numpy.save('./raw_ds/{0}.{1}.raw_xlbl.npy'.format(sysname, pathname, ), xlbl)
+
+    rel_x = make_relative_ds(x, ref_offset, out=x, )  # in place: raw x is saved.
 
     numpy.save('./conf_ds/{0}.{1}.rel_x.npy'.format(sysname, pathname, ), rel_x)
     numpy.save('./conf_ds/{0}.{1}.rel_xlbl.npy'.format(sysname, pathname, ), xlbl)
-    numpy.save('./raw_ds/{0}.{1}.raw_x.npy'.format(sysname,pathname,), x)
-    numpy.save('./raw_ds/{0}.{1}.raw_xlbl.npy'.format(sysname, pathname, ), xlbl)
 
-for s in ['toho_amp', 'toho_cex']:
-    for p in ['r1ae', 'r2ae', ]:
-        merge_ds(s, p, )
+if __name__ == '__main__':
+    for s in ['toho_amp', 'toho_cex']:
+        for p in ['r1ae', 'r2ae', ]:
+            merge_ds(s, p, )
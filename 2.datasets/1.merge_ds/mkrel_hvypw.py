@@ -2,31 +2,41 @@
 # Zilin Song, 21 AUG 2021
 # 
  
-import numpy
-ampr1 = numpy.load('../0.mk_ds/rawds_hvypw/toho_amp.r1ae.hvypw_distmat.npy')
-ampr2 = numpy.load('../0.mk_ds/rawds_hvypw/toho_amp.r2ae.hvypw_distmat.npy')
-cexr1 = numpy.load('../0.mk_ds/rawds_hvypw/toho_cex.r1ae.hvypw_distmat.npy')
-cexr2 = numpy.load('../0.mk_ds/rawds_hvypw/toho_cex.r2ae.hvypw_distmat.npy')
-
-pw_all = numpy.concatenate( (ampr1, cexr1, ampr2, cexr2), axis=0, )
-
-def make_relative_ds(ds, ref_offset, nrep=50):
-    '''Process the ds into relative dist data.
-    ds_elabels      -> labels of replica energies.
-    ref_offset = 47 -> last replica (AE) as reference.
+import os, numpy
+from merge_ds import make_relative_ds
+
+dsdirs = [
+    '../0.mk_ds/rawds_hvypw/toho_amp.r1ae.hvypw_distmat.npy', 
+    '../0.mk_ds/rawds_hvypw/toho_cex.r1ae.hvypw_distmat.npy', 
+    '../0.mk_ds/rawds_hvypw/toho_amp.r2ae.hvypw_distmat.npy', 
+    '../0.mk_ds/rawds_hvypw/toho_cex.r2ae.hvypw_distmat.npy', 
+]
+
+def merge_relative_ds(dsdirs, outdir, ref_offset, nrep=50, chunk_paths=20, ):
+    '''Merge the datasets in dsdirs (in order) into outdir as relative dist data, see make_relative_ds().
+    The datasets are read and written by blocks of chunk_paths paths: 
+    the memory usage does not grow with the number of paths or features.
     '''
-    relative_ds = []
-    for rid in range(ds.shape[0]):
-        if rid % nrep == 0:
-            refdistrow = ds[ rid + ref_offset ].copy()    # use Last replica (AE) as the reference.
-        # refdistrow = ds[ref_offset].copy()              # use one replica as the global reference.
-        distrow = numpy.round_(ds[rid] - refdistrow, 8, )
-        relative_ds.append(distrow)
+    dsmats = [numpy.load(dsdir, mmap_mode='r', ) for dsdir in dsdirs]
 
-    return numpy.asarray(relative_ds)
+    if len(set([dsmat.shape[1:] for dsmat in dsmats])) != 1 or any([dsmat.shape[0] % nrep != 0 for dsmat in dsmats]):
+        raise ValueError('Inconsistent shapes {0}: check merge_relative_ds().'.format([dsmat.shape for dsmat in dsmats]))
 
-rel_pw_all = make_relative_ds(pw_all, 49)
+    os.makedirs(os.path.dirname(outdir), exist_ok=True, )
+    outmat = numpy.lib.format.open_memmap(
+        outdir, mode='w+', dtype=numpy.result_type(*dsmats), shape=(sum([dsmat.shape[0] for dsmat in dsmats]), ) + dsmats[0].shape[1:], 
+    )
 
-print(rel_pw_all.shape)
+    offset = 0
+    for dsmat in dsmats:
+        for rid in range(0, dsmat.shape[0], chunk_paths*nrep):
+            _block = dsmat[rid:rid+chunk_paths*nrep]
+            make_relative_ds(_block, ref_offset, nrep, out=outmat[offset+rid:offset+rid+_block.shape[0]], )
+        offset += dsmat.shape[0]
 
-numpy.save('./hvypw_rel/hvypw_rel_ds.npy', rel_pw_all)
\ No newline at end of file
+    outmat.flush()
+    return outmat
+
+rel_pw_all = merge_relative_ds(dsdirs, './hvypw_rel/hvypw_rel_ds.npy', 49, )
+
+print(rel_pw_all.shape)
@@ -21,6 +21,12 @@ def rescale(x, x_min, x_max, resc_x_min=-1., resc_x_max=1):
     else:
         return x_rescale
 
+def path_ids(npath, nrep=50, ):
+    '''The path id of each replica, of shape (npath*nrep, ): 
+    replicas p*nrep to (p+1)*nrep-1 are on path p.
+    '''
+    return numpy.repeat(numpy.arange(npath, dtype=numpy.int32, ), nrep, )
+
 def resc_ds(sysname, pathname, nrep=50):
     '''Produce rescaled ds.
     '''
@@ -33,36 +39,26 @@ def resc_ds(sysname, pathname, nrep=50):
     # range of the variables for each feature dim.
     # x_abs_max = find_range(xall_rel, abs_vals=True)
     # x_max = find_range(x_rel, abs_vals=True)
-    x_resc = []
-    onehot = []
-    for p in range(npath):
-        xpath = x_rel[p*nrep:(p+1)*nrep]
-        # x_min, x_max = xpath[0], xpath[-1]
-        # x_min, x_max = find_range(xpath)
-        x_max = find_range(xpath, abs_vals=True)
-        xpath_resc = rescale(xpath, -x_max, x_max)
-        x_resc.extend(xpath_resc)
+    xpaths = x_rel.reshape(npath, nrep, -1, )                           # (npath, nrep, nfeat)
+    # x_min, x_max = xpaths[:, 0:1], xpaths[:, -1:]
+    x_max  = numpy.amax(numpy.abs(xpaths), axis=1, keepdims=True, )     # per path max-abs of each feature.
+    x_resc = rescale(xpaths, -x_max, x_max).reshape(x_rel.shape)
 
-        # pid labels.
-        onehot_path = numpy.zeros( (npath) )
-        onehot_path[p] = 1
-        onehot.extend([onehot_path for i in range(nrep)])
-
-    x_resc=numpy.asarray(x_resc)
     print(x_resc.shape)
     numpy.save('./conf_ds/{0}.{1}.x.npy'.format(sysname, pathname, ), x_resc, )
-    numpy.save('./conf_ds/{0}.{1}.x_onehot.npy'.format(sysname, pathname, ), onehot, )
 
-    # onehot-encoding for both ds
-    onehot=[]
-    for p in range(npath*2):
-        # pid labels.
-        onehot_path = numpy.zeros( (npath*2) )
-        onehot_path[p] = 1
-        onehot.extend([onehot_path for i in range(nrep)])
-    
-    numpy.save('./conf_ds/both.{0}.x_onehot.npy'.format(pathname), onehot)
+    # pid labels, see iomisc.onehot() for the one-hot encoding.
+    numpy.save('./conf_ds/{0}.{1}.x_pid.npy'.format(sysname, pathname, ), path_ids(npath, nrep, ), )
 
-for s in ['toho_amp', 'toho_cex']:
+def resc_both(pathname, npath=200, nrep=50, ):
+    '''Produce the pid labels for both ds.
+    '''
+    numpy.save('./conf_ds/both.{0}.x_pid.npy'.format(pathname), path_ids(npath*2, nrep, ), )
+
+if __name__ == '__main__':
+    for s in ['toho_amp', 'toho_cex']:
+        for p in ['r1ae', 'r2ae']:
+            resc_ds(s, p, )
+    
     for p in ['r1ae', 'r2ae']:
-        resc_ds(s, p, )
+        resc_both(p, )
@@ -2,79 +2,165 @@
 # Zilin Song, 22 AUG 2021
 # 
 
-import numpy, iomisc
-from numpy.lib.function_base import average
-from numpy.core.fromnumeric import var
-from sklearn.feature_selection import SelectKBest, mutual_info_regression
-
-def kbest_mi_selection(x, y, nfeatures, ):
-    # feature selection.
-    selector = SelectKBest(score_func=mutual_info_regression, k=nfeatures, )
-    selector.fit(x, y, )
-    selected_idx = selector.get_support(indices=True)
-    
-    return selected_idx
+import os, hashlib, multiprocessing, numpy, iomisc
+from sklearn.feature_selection import mutual_info_regression
 
-def aver_mi_per_path(x, y, npath=200, nrep=50):
-    '''compute the averaged MI per path'''
-    mi = []
-    for p in range(npath):
-        xpath  = x[p*nrep: p*nrep+nrep]
-        ypath  = y[p*nrep: p*nrep+nrep]
-        mipath = mutual_info_regression(xpath, ypath)
-        mi.append(mipath)
+def _pool_map(func, args, nproc=None, ):
+    '''map func over args with a pool of nproc processes, in order.
+    '''
+    with multiprocessing.Pool(nproc or len(os.sched_getaffinity(0)), ) as pool:
+        return pool.map(func, args, chunksize=1, )
+
+def _mi(x_y_seed, ):
+    '''mutual_info_regression() of one (x, y, seed) for the pool workers.
+    '''
+    x, y, seed = x_y_seed
+    return mutual_info_regression(x, y, random_state=seed, )
+
+def mi_scores(x, y, nproc=None, seed=0, nblock=64, ):
+    '''MI of each feature in x with y pooled over all replicas of all paths.
+    The MI of each feature is independent: features are scored by blocks of nblock across the pool.
+    NOTE mutual_info_regression() adds a small noise to x drawn from random_state per call: 
+         each block draws the noise of seed, so the scores are reproducible but not bitwise the 
+         scores of one call over all features, and near-ties at the k-th feature could rank otherwise.
+    '''
+    blocks = [x[:, i:i+nblock] for i in range(0, x.shape[1], nblock)]
+    return numpy.concatenate(_pool_map(_mi, [(xblk, y, seed, ) for xblk in blocks], nproc, ), axis=0, )
+
+def aver_mi_per_path(x, y, npath=200, nrep=50, nproc=None, seed=0, ):
+    '''compute the averaged MI per path, paths are scored across the pool with seed+p on path p.
+    NOTE not used by the selection, which ranks by the pooled MI of mi_scores(): load_scores(which=('aver_mi', )).
+    '''
+    mi = _pool_map(_mi, [(x[p*nrep:(p+1)*nrep], y[p*nrep:(p+1)*nrep], seed+p, ) for p in range(npath)], nproc, )
 
     mi = numpy.asarray(mi)
     print(mi.shape)
     aver_mi = numpy.average(mi, axis=0)
     return aver_mi
 
-def aver_var_per_path(x, thresh, npath=200, nrep=50):
-    variance = []
-    for p in range(npath):
-        xpath  = x[p*nrep: p*nrep+nrep]
-        varpath = numpy.var(xpath, axis=0)
-        variance.append(varpath)
+def var_scores(x, npath=200, nrep=50, ):
+    '''compute the averaged variance per path.
+    '''
+    return numpy.average(numpy.var(x.reshape(npath, nrep, -1), axis=1, ), axis=0, )
+
+def scoredir():
+    '''Directory of the cached feature scores.
+    '''
+    return './scores'
 
-    variance = numpy.asarray(variance)
-    print(variance.shape)
-    aver_variance = numpy.average(variance, axis=0)
-    sel_idx = numpy.argwhere(aver_variance>thresh)
+def load_scores(sysname, pathname, which=('var', 'mi', ), nproc=None, seed=0, ):
+    '''Feature scores of the raw (relative) ds, cached on disk as 
+        {scoredir}/{sysname}.{pathname}.{score}.{hash of x, y and seed}.npy
+    which:  var     -> averaged variance per path, see var_scores();
+            mi      -> MI over all replicas, see mi_scores();
+            aver_mi -> averaged MI per path, see aver_mi_per_path().
+    return {score: score vector of shape (nfeat, )}
+    '''
+    x, _ = iomisc.load_x(sysname, pathname, 'raw', )
+    y    = iomisc.load_y(sysname, pathname, )[0]
+    _key = hashlib.sha1(x.tobytes() + y.tobytes() + str(seed).encode()).hexdigest()[:16]
 
-    # print(sel_idx)
-    return sel_idx
+    scores = {}
+    for score in which:
+        _scoredir = '{0}/{1}.{2}.{3}.{4}.npy'.format(scoredir(), sysname, pathname, score, _key, )
+        
+        if os.path.isfile(_scoredir):
+            scores[score] = numpy.load(_scoredir)
+            continue
 
-def select_features(pathname, ):
-    '''Feature selection on relative ds. 
+        scores[score] = var_scores(x, )                                  if score == 'var'     else \
+                        mi_scores(x, y, nproc, seed, )                   if score == 'mi'      else \
+                        aver_mi_per_path(x, y, nproc=nproc, seed=seed, ) if score == 'aver_mi' else \
+                        None
+        if scores[score] is None: raise ValueError('Unexpected score: {0}'.format(score))
+
+        os.makedirs(scoredir(), exist_ok=True, )
+        numpy.save(_scoredir, scores[score], )
+
+    return scores
+
+def mi_ranking(scores, ):
+    '''Features in ascending order of their MI scores, see load_scores().
+    '''
+    return numpy.argsort(scores['mi'], kind='mergesort', )
+
+def kbest_in(ranking, lv_idx, nfeatures, ):
+    '''Positions in lv_idx of the nfeatures highest ranked features in lv_idx, 
+    with ranking = mi_ranking(scores), the k best as sklearn SelectKBest() ranks the scores (mergesort on ties).
     '''
-    # load raw data.
-    amp_x, amp_xlbl,  = iomisc.load_x('toho_amp', pathname, 'raw')
-    cex_x, cex_xlbl,  = iomisc.load_x('toho_cex', pathname, 'raw')
-    amp_y             = iomisc.load_y('toho_amp', pathname, )[0]
-    cex_y             = iomisc.load_y('toho_cex', pathname, )[0]
+    _ranked = ranking[numpy.isin(ranking, lv_idx, )][-nfeatures:]
+    return numpy.sort(numpy.searchsorted(lv_idx, _ranked, ))
 
+def selection_idx(pathname, amp_scores, cex_scores, thresh=0.03, nfeatures=None, rankings=None, ):
+    '''Indices of the selected features: lv_idx (low variance removed) on the raw ds and mi_idx on lv_idx.
+    rankings: (amp, cex) mi_ranking() of the scores, ranked here if None.
+    '''
     # feature selection: remove low variances with raw data.
-    lv_amp_idx = aver_var_per_path(amp_x, 0.03)
-    lv_cex_idx = aver_var_per_path(cex_x, 0.03)
+    lv_amp_idx = numpy.argwhere(amp_scores['var'] > thresh)
+    lv_cex_idx = numpy.argwhere(cex_scores['var'] > thresh)
     lv_idx = numpy.unique(numpy.concatenate( (lv_amp_idx, lv_cex_idx) ) ) # merge and concat retained features.
     # lv_idx = numpy.intersect1d(lv_amp_idx, lv_cex_idx)
 
-    # apply low variance selection.
-    amp_x, amp_xlbl,  = iomisc.load_x('toho_amp', pathname, 'raw')
-    cex_x, cex_xlbl,  = iomisc.load_x('toho_cex', pathname, 'raw')
-    lv_amp_x    = numpy.take(  amp_x, lv_idx, axis=1)
-    lv_cex_x    = numpy.take(  cex_x, lv_idx, axis=1)
-    lv_amp_xlbl = numpy.take(amp_xlbl, lv_idx)
-    lv_cex_xlbl = numpy.take(cex_xlbl, lv_idx)
-    print('{}'.format(lv_cex_xlbl.shape))
-
     # feature selection: based on mutual informaiton.
-    nfeatures = 15 if pathname == 'r1ae' else 11
-    mi_amp_idx = kbest_mi_selection(lv_amp_x, amp_y, nfeatures)
-    mi_cex_idx = kbest_mi_selection(lv_cex_x, cex_y, nfeatures)
+    amp_rank, cex_rank = (mi_ranking(amp_scores), mi_ranking(cex_scores), ) if rankings is None else rankings
+    nfeatures = (15 if pathname == 'r1ae' else 11) if nfeatures is None else nfeatures
+    mi_amp_idx = kbest_in(amp_rank, lv_idx, nfeatures)
+    mi_cex_idx = kbest_in(cex_rank, lv_idx, nfeatures)
     # mi_idx = numpy.unique(numpy.concatenate( (mi_amp_idx, mi_cex_idx, ) ) )
     mi_idx = numpy.intersect1d(mi_amp_idx, mi_cex_idx)
     if pathname == 'r1ae':mi_idx = numpy.sort(numpy.append(mi_idx, 8)) # feature 8 is manually appended: Ser130 HG1 - beta-lactam O10B/O12. H atoms are always selected.
+
+    return lv_idx, mi_idx
+
+def sweepdir():
+    '''Directory of the feature selection sweeps.
+    '''
+    return './sweep'
+
+def sweep(pathname, threshs, nfeatures, nproc=None, seed=0, ):
+    '''Feature selection with each (variance threshold in threshs, k in nfeatures) from the cached scores.
+    The selected feature indices (on the raw ds) of each setting are written as one row of the table
+        {sweepdir}/{pathname}.fsel_sweep.dat
+    instead of the selected ds, see load_sweep().
+    '''
+    amp_scores = load_scores('toho_amp', pathname, nproc=nproc, seed=seed, )
+    cex_scores = load_scores('toho_cex', pathname, nproc=nproc, seed=seed, )
+    rankings   = (mi_ranking(amp_scores), mi_ranking(cex_scores), )
+
+    os.makedirs(sweepdir(), exist_ok=True, )
+    with open('{0}/{1}.fsel_sweep.dat'.format(sweepdir(), pathname, ), 'w') as logout:
+        logout.write('#thresh\tk\tn_lv\tn_sel\tfeature_idx\n')
+
+        for thresh in threshs:
+            for k in nfeatures:
+                lv_idx, mi_idx = selection_idx(pathname, amp_scores, cex_scores, thresh, k, rankings, )
+                sel_idx = lv_idx[mi_idx]
+                logout.write('{0}\t{1}\t{2}\t{3}\t{4}\n'.format(
+                    thresh, k, lv_idx.shape[0], sel_idx.shape[0], ','.join([str(i) for i in sel_idx]), ))
+
+def load_sweep(pathname, ):
+    '''Load the sweep table of pathname, see sweep().
+    return {(thresh, k): indices of the selected features on the raw ds, }
+    '''
+    table = {}
+    with open('{0}/{1}.fsel_sweep.dat'.format(sweepdir(), pathname, ), 'r') as login:
+        for line in login:
+            if line.startswith('#'):
+                continue
+            words = line.rstrip('\n').split('\t')
+            table[(float(words[0]), int(words[1]), )] = numpy.asarray([int(i) for i in words[4].split(',') if i != ''], dtype=int, )
+
+    return table
+
+def select_features(pathname, thresh=0.03, nfeatures=None, nproc=None, seed=0, ):
+    '''Feature selection on relative ds. 
+    The k best features by the MI pooled over all replicas, see mi_scores(), not by the averaged MI per path.
+    The scores are cached, see load_scores(): changing thresh or nfeatures does not rescore.
+    '''
+    amp_scores = load_scores('toho_amp', pathname, nproc=nproc, seed=seed, )
+    cex_scores = load_scores('toho_cex', pathname, nproc=nproc, seed=seed, )
+    lv_idx, mi_idx = selection_idx(pathname, amp_scores, cex_scores, thresh, nfeatures, )
+    print('{}'.format(lv_idx.shape))
     
     # apply selections (lv_idx, mi_idx) to the unselected ds. 
     amp_x, amp_xlbl,  = iomisc.load_x('toho_amp', pathname, 'resc')
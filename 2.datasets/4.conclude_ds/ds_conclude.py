@@ -3,30 +3,53 @@
 # 
 
 from re import X
-import numpy, iomisc
+import numpy, iomisc, dsbundle
 
 nrep   = 50
 npath  = 200
 seqlen = 3
 nseq_per_path = nrep - seqlen + 1
 
-for sysname in ['toho_amp', 'toho_cex']:
-    for pathname in ['r1ae', 'r2ae']:
-        x, xlbl, pid = iomisc.load_x(sysname, pathname)
-        y, ylbl      = iomisc.load_y(sysname, pathname)
-        
-        with open(f'./fin_ds/{sysname}.{pathname}.xlbl.dat', 'w') as logout:
-            for i in range(xlbl.shape[0]):
-                logout.write(f'{i:>4}\t{xlbl[i]}\n')
-
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.x.npy', numpy.asarray(x))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.xlbl.npy', numpy.asarray(xlbl, dtype=str))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.x_onehot.npy', numpy.asarray(pid))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.y.npy', numpy.asarray(y))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.ylbl.npy', numpy.asarray(ylbl, dtype=str))
-
-# sysname == 'both'
-for pathname in ['r1ae', 'r2ae']:
+def provenance(sysname, pathname, npath, ):
+    '''Provenance of the bundle of (sysname, pathname).
+    npath -> number of paths, the width of the path one-hot encoding.
+    '''
+    return {
+        'sysname':  sysname, 
+        'pathname': pathname, 
+        'npath':    npath, 
+        'nrep':     nrep, 
+        'sources':  {
+            'x':    '3.feature_sel/conf_ds', 
+            'xlbl': '3.feature_sel/conf_ds', 
+            'pid':  '2.resc_ds/conf_ds', 
+            'y':    '1.merge_ds/ener_ds', 
+            'ylbl': '1.merge_ds/ener_ds', 
+        }, 
+    }
+
+def conclude(sysname, pathname, ):
+    '''Conclude the ds of (sysname, pathname) into one bundle.
+    '''
+    x, xlbl, pid = iomisc.load_x(sysname, pathname)
+    y, ylbl      = iomisc.load_y(sysname, pathname)
+    
+    with open(f'./fin_ds/{sysname}.{pathname}.xlbl.dat', 'w') as logout:
+        for i in range(xlbl.shape[0]):
+            logout.write(f'{i:>4}\t{xlbl[i]}\n')
+
+    dsbundle.save_bundle(f'./fin_ds/{sysname}.{pathname}.ds', {
+            'x':    numpy.asarray(x), 
+            'y':    numpy.asarray(y), 
+            'pid':  numpy.asarray(pid, dtype=numpy.int32), 
+            'xlbl': numpy.asarray(xlbl, dtype=str), 
+            'ylbl': numpy.asarray(ylbl, dtype=str), 
+        }, provenance(sysname, pathname, npath, ), 
+    )
+
+def conclude_both(pathname, ):
+    '''Conclude the ds of sysname == 'both' into one bundle.
+    '''
     x, pid = iomisc.load_x('both', pathname)
     
     y_amp, ylbl_amp = iomisc.load_y('toho_amp', pathname)
@@ -35,7 +58,18 @@ for pathname in ['r1ae', 'r2ae']:
     y = numpy.concatenate((y_amp, y_cex), axis=0)
     ylbl = numpy.concatenate((ylbl_amp, ylbl_cex), axis=0)
 
-    numpy.save(f'./fin_ds/both.{pathname}.x.npy', numpy.asarray(x))
-    numpy.save(f'./fin_ds/both.{pathname}.x_onehot.npy', numpy.asarray(pid))
-    numpy.save(f'./fin_ds/both.{pathname}.y.npy', numpy.asarray(y))
-    numpy.save(f'./fin_ds/both.{pathname}.ylbl.npy', numpy.asarray(ylbl, dtype=str))
+    dsbundle.save_bundle(f'./fin_ds/both.{pathname}.ds', {
+            'x':    numpy.asarray(x), 
+            'y':    numpy.asarray(y), 
+            'pid':  numpy.asarray(pid, dtype=numpy.int32), 
+            'ylbl': numpy.asarray(ylbl, dtype=str), 
+        }, provenance('both', pathname, npath*2, ), 
+    )
+
+if __name__ == '__main__':
+    for sysname in ['toho_amp', 'toho_cex']:
+        for pathname in ['r1ae', 'r2ae']:
+            conclude(sysname, pathname, )
+
+    for pathname in ['r1ae', 'r2ae']:
+        conclude_both(pathname, )
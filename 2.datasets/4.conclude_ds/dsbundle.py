@@ -0,0 +1,71 @@
+# The single-file ds bundle: written by ds_conclude.py, read by the training stages.
+# Zilin Song, 22 AUG 2021
+# 
+
+import os, json, hashlib, numpy
+
+_verified = set()    # (bundle, size, mtime) checked against the sha1 of its columns, per process.
+
+def save_bundle(bundledir, columns, provenance, align=64, ):
+    '''Save the columns {name: numpy.ndarray} of one ds as a single file bundledir:
+        8 bytes magic (FINDS001), 8 bytes header length, the json header, then the data;
+    the header holds the provenance and {name: dtype, shape, offset, sha1} of each column,
+    each column is stored contiguously at its offset (relative to the data, aligned to align bytes)
+    so that it could be memory-mapped by column, see load_bundle().
+    '''
+    columns = {name: numpy.ascontiguousarray(arr) for name, arr in columns.items()}
+
+    header, offset = {'provenance': provenance, 'align': align, 'columns': {}, }, 0
+    for name, arr in columns.items():
+        header['columns'][name] = {
+            'dtype':  arr.dtype.str, 
+            'shape':  list(arr.shape), 
+            'offset': offset, 
+            'sha1':   hashlib.sha1(arr.tobytes()).hexdigest(), 
+        }
+        offset += -(-arr.nbytes // align) * align
+    
+    _header    = json.dumps(header, ).encode()
+    _datastart = -(-(16 + len(_header)) // align) * align
+
+    with open(f'{bundledir}.tmp', 'wb') as fo:
+        fo.write(b'FINDS001')
+        fo.write(numpy.uint64(len(_header)).tobytes())
+        fo.write(_header)
+        for name, arr in columns.items():
+            fo.seek(_datastart + header['columns'][name]['offset'])
+            fo.write(arr.tobytes())
+        fo.truncate(_datastart + offset)
+    os.replace(f'{bundledir}.tmp', bundledir)
+
+def load_bundle(bundledir, verify=True, ):
+    '''Open the single-file ds bundledir written by save_bundle().
+    The columns are memory-mapped: only the rows/columns accessed are read from the disk.
+    verify:     check the sha1 of each column against the header, which reads the whole bundle:
+                once per process for each version (size, mtime) of the bundle.
+    return {name: numpy.memmap}, provenance
+    '''
+    _stat    = os.stat(bundledir)
+    _version = (os.path.abspath(bundledir), _stat.st_size, _stat.st_mtime_ns, )
+
+    with open(bundledir, 'rb') as fi:
+        if fi.read(8) != b'FINDS001': raise ValueError(f'Not a ds bundle: {bundledir}')
+        _hlen   = int(numpy.frombuffer(fi.read(8), dtype=numpy.uint64, )[0])
+        header  = json.loads(fi.read(_hlen).decode())
+    _datastart = -(-(16 + _hlen) // header['align']) * header['align']
+
+    columns = {}
+    for name, col in header['columns'].items():
+        columns[name] = numpy.memmap(bundledir, dtype=numpy.dtype(col['dtype']), mode='r', 
+                                     offset=_datastart + col['offset'], shape=tuple(col['shape']), )
+
+        if verify and not _version in _verified and hashlib.sha1(columns[name].tobytes()).hexdigest() != col['sha1']:
+            raise ValueError(f'Column {name} of {bundledir} does not match its sha1: corrupted or truncated bundle.')
+    
+    if verify: _verified.add(_version)
+    return columns, header['provenance']
+
+def onehot(pid, npath, ):
+    '''One-hot encoding of the path ids pid, of shape (pid.shape[0], npath).
+    '''
+    return numpy.eye(npath, dtype=numpy.float64, )[pid]
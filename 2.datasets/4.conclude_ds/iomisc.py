@@ -9,6 +9,7 @@ def load_x(sysname, pathname,):
     sysname:    toho_amp, toho_cex;
     pathname:   r1ae, r2ae;
     whichds:    norm, resc, raw
+    return x, (xlbl,) and the path ids, see dsbundle.onehot().
     '''
     # directory settings.
     # _datprefx = '../2.norm_ds/conf_ds_{}'.format(whichds)
@@ -19,7 +20,7 @@ def load_x(sysname, pathname,):
 
     _datname = 'x'
     _lblname = 'xlbl'
-    _pidname = 'x_onehot'
+    _pidname = 'x_pid'
 
     _datdir = '{0}/{1}.{2}.{3}.npy'.format(_datprefx, sysname, pathname, _datname, )
     _lbldir = '{0}/{1}.{2}.{3}.npy'.format(_lblrepfx, sysname, pathname, _lblname, )
@@ -2,56 +2,45 @@
 # Zilin Song, 22 AUG 2021
 # 
 
-from re import X
-import numpy, iomisc
+import sys, numpy
 
 nrep   = 50
 npath  = 200
-seqlen = 3
-nseq_per_path = nrep - seqlen + 1
-
-test_seed=[]
-for p in range(npath):
-    seed = numpy.asarray(numpy.random.choice(50, 5, replace=False))
-    test_seed.append(seed+p*50)
-    print(seed+p*50)
-    
-    # numpy.asarray(numpy.random.choice(10000, size=1000, replace=False, )) # random seed.
-test_seed = numpy.asarray(test_seed).flatten()
-print(test_seed)
-
-for sysname in ['toho_amp', 'toho_cex']:
-    for pathname in ['r1ae', 'r2ae']:
-        x, xlbl, pid = iomisc.load_x(sysname, pathname)
-        y, ylbl      = iomisc.load_y(sysname, pathname)
-        
-        with open(f'./fin_ds/{sysname}.{pathname}.xlbl.dat', 'w') as logout:
-            for i in range(xlbl.shape[0]):
-                logout.write(f'{i:>4}\t{xlbl[i]}\n')
-
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.x_test.npy', numpy.asarray(          x[test_seed]))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.y_test.npy', numpy.asarray(          y[test_seed]))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.x_onehot_test.npy', numpy.asarray( pid[test_seed]))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.x_train.npy', numpy.asarray(       numpy.delete(  x, test_seed, axis=0)))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.y_train.npy', numpy.asarray(       numpy.delete(  y, test_seed, axis=0)))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.x_onehot_train.npy', numpy.asarray(numpy.delete(pid, test_seed, axis=0)))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.xlbl.npy', numpy.asarray(     xlbl, dtype=str))
-        numpy.save(f'./fin_ds/{sysname}.{pathname}.ylbl.npy', numpy.asarray(     ylbl, dtype=str))
-
-# sysname == 'both'
-for pathname in ['r1ae', 'r2ae']:
-    x, pid = iomisc.load_x('both', pathname)
-    
-    y_amp, ylbl_amp = iomisc.load_y('toho_amp', pathname)
-    y_cex, ylbl_cex = iomisc.load_y('toho_cex', pathname)
-
-    y = numpy.concatenate((y_amp, y_cex), axis=0)
-    ylbl = numpy.concatenate((ylbl_amp, ylbl_cex), axis=0)
-
-    numpy.save(f'./fin_ds/both.{pathname}.x_test.npy', numpy.asarray(          x[test_seed]))
-    numpy.save(f'./fin_ds/both.{pathname}.y_test.npy', numpy.asarray(          y[test_seed]))
-    numpy.save(f'./fin_ds/both.{pathname}.x_onehot_test.npy', numpy.asarray( pid[test_seed]))
-    numpy.save(f'./fin_ds/both.{pathname}.x_train.npy', numpy.asarray(       numpy.delete(  x, test_seed, axis=0)))
-    numpy.save(f'./fin_ds/both.{pathname}.y_train.npy', numpy.asarray(       numpy.delete(  y, test_seed, axis=0)))
-    numpy.save(f'./fin_ds/both.{pathname}.x_onehot_train.npy', numpy.asarray(numpy.delete(pid, test_seed, axis=0)))
-    numpy.save(f'./fin_ds/both.{pathname}.ylbl.npy', numpy.asarray(ylbl, dtype=str))
+ntest  = 5      # test replicas per path.
+
+def make_split(seed, npath=200, nrep=50, ntest=5, ):
+    '''Randomly choose ntest test replicas on each path, reproducible from seed.
+    '''
+    rng = numpy.random.default_rng(seed)
+    return numpy.concatenate([rng.choice(nrep, ntest, replace=False, ) + p*nrep for p in range(npath)])
+
+def split_from_log(logdir, npath=200, ):
+    '''The test ids of the original split, as printed per path in logdir (testids.log).
+    '''
+    test_ids = []
+    with open(logdir, 'r') as login:
+        for line in login:
+            if len(test_ids) == npath:
+                break
+            test_ids.append([int(i) for i in line.strip().strip('[]').split()])
+
+    return numpy.asarray(test_ids).flatten()
+
+def save_split(splitname, test_ids, seed, ):
+    '''Save the split manifest ./fin_ds/{splitname}.split.npz:
+        test_ids    -> indices of the test replicas, the rest is for training;
+        seed        -> seed of make_split(), -1 if not generated by make_split();
+        npath, nrep -> shape of each ds.
+    The same test_ids apply to all (sysname, pathname), including both.
+    '''
+    print(test_ids)
+    numpy.savez(f'./fin_ds/{splitname}.split.npz',
+                test_ids=numpy.asarray(test_ids, dtype=numpy.int64), seed=seed, npath=npath, nrep=nrep, )
+
+if __name__ == '__main__':
+    # python ds_split.py [nsplits]
+    save_split('split0', split_from_log('./testids.log', npath, ), -1, )     # the original split.
+
+    # more random splits for repeated CV.
+    for s in range(1, int(sys.argv[1]) + 1 if len(sys.argv) > 1 else 1):
+        save_split(f'split{s}', make_split(s, npath, nrep, ntest, ), s, )
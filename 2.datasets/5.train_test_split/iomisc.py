@@ -19,7 +19,7 @@ def load_x(sysname, pathname,):
 
     _datname = 'x'
     _lblname = 'xlbl'
-    _pidname = 'x_onehot'
+    _pidname = 'x_pid'
 
     _datdir = '{0}/{1}.{2}.{3}.npy'.format(_datprefx, sysname, pathname, _datname, )
     _lbldir = '{0}/{1}.{2}.{3}.npy'.format(_lblrepfx, sysname, pathname, _lblname, )
@@ -0,0 +1,299 @@
+# Pipeline runner of the dataset stages 0.mk_ds -> 5.train_test_split.
+# Each step is skipped if its outputs are cached under the fingerprint of
+# its code, parameters and inputs; the (sysname, pathname) branches of a step run concurrently.
+#
+
+import os, sys, glob, json, shutil, hashlib, threading, subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sysnames  = ['toho_amp', 'toho_cex', ]
+pathnames = ['r1ae', 'r2ae', ]
+
+_filehashes = None              # abs file path -> [size, mtime_ns, sha1], see file_fingerprint().
+_filehashes_lock = threading.Lock()
+
+def datasetsdir():
+    '''The 2.datasets directory.
+    '''
+    return os.path.dirname(os.path.abspath(__file__))
+
+def cachedir():
+    '''Directory of the cached stage outputs.
+    '''
+    return '{0}/.stagecache'.format(datasetsdir())
+
+def sampling_dir():
+    '''Directory of the sampled paths read by 0.mk_ds, see 0.mk_ds/iomisc.basedir().
+    '''
+    return subprocess.run([sys.executable, '-c', 'import iomisc; print(iomisc.basedir())', ],
+                          cwd='{0}/0.mk_ds'.format(datasetsdir()), capture_output=True, text=True, check=True,
+                        ).stdout.strip()
+
+def steps(sampdir, ):
+    '''All steps of the pipeline, in order. Each step:
+        stage:    stage directory, where the step runs;
+        branches: [{sysname, pathname}, ] run concurrently, format the args, inputs and outputs;
+        args:     python arguments of the step, {nproc} and {nsplits} are formatted with the params;
+        inputs:   globs of the input files, relative to 2.datasets (or absolute);
+        outputs:  globs of the output files, relative to the stage directory.
+    '''
+    sp_branches = [{'sysname': s, 'pathname': p, } for s in sysnames for p in pathnames]
+    p_branches  = [{'pathname': p, } for p in pathnames]
+    samples     = ['{0}/*/*/path_opt/*.psf'.format(sampdir), '{0}/*/*/path_opt/*.cor'.format(sampdir), ]
+
+    return [
+        {'stage': '0.mk_ds', 'name': 'hbond_labels', 'branches': [{}, ],
+         'args': ['-c', 'import mk_hbonds; mk_hbonds.launcher_find_hbonds({nproc})', ],
+         'inputs': samples,
+         'outputs': ['rawds_hbonds_detectlabels/detect.*.hbonds_labels.npy', 'rawds_hbonds_detectlabels/paths/*.json', ], },
+
+        {'stage': '0.mk_ds', 'name': 'feats', 'branches': [{}, ],
+         'args': ['-c', 'import mk_feats; mk_feats.main(None, {nproc})', ],
+         'inputs': samples + ['0.mk_ds/rawds_hbonds_detectlabels/detect.*.hbonds_labels.npy', ],
+         'outputs': ['rawds_{0}/*'.format(f) for f in ['rxc', 'chembonds', 'hvypw', 'hbonds', ]] + ['valid_toho_cex_r2ae/*', ], },
+
+        {'stage': '0.mk_ds', 'name': 'ener', 'branches': sp_branches,
+         'args': ['-c', 'import mk_ener; mk_ener.process_ener("{sysname}", "{pathname}")', ],
+         'inputs': ['{0}/*.{{sysname}}.*/*.paths.sp/*/path*.ene'.format(sampdir), ],
+         'outputs': ['rawds_ener/{sysname}.{pathname}.*.npy', ], },
+
+        {'stage': '1.merge_ds', 'name': 'merge', 'branches': sp_branches,
+         'args': ['-c', 'import merge_ds; merge_ds.merge_ds("{sysname}", "{pathname}")', ],
+         'inputs': ['0.mk_ds/rawds_{0}/{{sysname}}.{{pathname}}.*.npy'.format(f) for f in ['rxc', 'chembonds', 'hbonds', 'ener', ]],
+         'outputs': ['ener_ds/{sysname}.{pathname}.*.npy', 'conf_ds/{sysname}.{pathname}.*.npy', 'raw_ds/{sysname}.{pathname}.*.npy', ], },
+
+        {'stage': '2.resc_ds', 'name': 'resc', 'branches': sp_branches,
+         'args': ['-c', 'import resc_ds; resc_ds.resc_ds("{sysname}", "{pathname}")', ],
+         'inputs': ['1.merge_ds/conf_ds/{sysname}.{pathname}.rel_x*.npy', ],
+         'outputs': ['conf_ds/{sysname}.{pathname}.x.npy', 'conf_ds/{sysname}.{pathname}.x_pid.npy', ], },
+
+        {'stage': '2.resc_ds', 'name': 'resc_both', 'branches': p_branches,
+         'args': ['-c', 'import resc_ds; resc_ds.resc_both("{pathname}")', ],
+         'inputs': [],
+         'outputs': ['conf_ds/both.{pathname}.x_pid.npy', ], },
+
+        {'stage': '3.feature_sel', 'name': 'select', 'branches': p_branches,
+         'args': ['-c', 'import fsel_kbest; fsel_kbest.select_features("{pathname}", nproc={nproc})', ],
+         'inputs': ['1.merge_ds/conf_ds/*.{pathname}.rel_x*.npy', '1.merge_ds/ener_ds/*.{pathname}.rel_y*.npy',
+                    '2.resc_ds/conf_ds/toho_*.{pathname}.x.npy', ],
+         'outputs': ['conf_ds/*.{pathname}.x.npy', 'conf_ds/*.{pathname}.xlbl.npy', ], },
+
+        {'stage': '4.conclude_ds', 'name': 'conclude', 'branches': sp_branches,
+         'args': ['-c', 'import ds_conclude; ds_conclude.conclude("{sysname}", "{pathname}")', ],
+         'inputs': ['3.feature_sel/conf_ds/{sysname}.{pathname}.x*.npy', '2.resc_ds/conf_ds/{sysname}.{pathname}.x_pid.npy',
+                    '1.merge_ds/ener_ds/{sysname}.{pathname}.rel_y*.npy', ],
+         'outputs': ['fin_ds/{sysname}.{pathname}.ds', 'fin_ds/{sysname}.{pathname}.xlbl.dat', ], },
+
+        {'stage': '4.conclude_ds', 'name': 'conclude_both', 'branches': p_branches,
+         'args': ['-c', 'import ds_conclude; ds_conclude.conclude_both("{pathname}")', ],
+         'inputs': ['3.feature_sel/conf_ds/both.{pathname}.x.npy', '2.resc_ds/conf_ds/both.{pathname}.x_pid.npy',
+                    '1.merge_ds/ener_ds/*.{pathname}.rel_y*.npy', ],
+         'outputs': ['fin_ds/both.{pathname}.ds', ], },
+
+        {'stage': '5.train_test_split', 'name': 'split', 'branches': [{}, ],
+         'args': ['ds_split.py', '{nsplits}', ],
+         'inputs': ['5.train_test_split/testids.log', ],
+         'outputs': ['fin_ds/*.split.npz', ], },
+    ]
+
+def report(line, ):
+    '''Print one line of progress, in one write: the branches run in threads.
+    '''
+    sys.stdout.write(line + '\n')
+    sys.stdout.flush()
+
+def file_fingerprint(filedir, ):
+    '''Fingerprint of one input file:
+        the content hash for files in 2.datasets (memoized by size and mtime in the cache directory),
+        size and mtime for the (large) external files, i.e., the sampled paths.
+    '''
+    global _filehashes
+    _stat = os.stat(filedir)
+
+    if not os.path.abspath(filedir).startswith(datasetsdir()):
+        return '{0}.{1}'.format(_stat.st_size, _stat.st_mtime_ns, )
+
+    with _filehashes_lock:
+        if _filehashes is None:
+            _memo = '{0}/filehashes.json'.format(cachedir())
+            _filehashes = {}
+            if os.path.isfile(_memo):
+                with open(_memo, 'r') as fi:
+                    _filehashes = json.load(fi)
+
+        _entry = _filehashes.get(os.path.abspath(filedir))
+        if not _entry is None and _entry[0] == _stat.st_size and _entry[1] == _stat.st_mtime_ns:
+            return _entry[2]
+
+    _sha1 = hashlib.sha1()
+    with open(filedir, 'rb') as fi:
+        for chunk in iter(lambda: fi.read(1 << 24), b''):
+            _sha1.update(chunk)
+
+    with _filehashes_lock:
+        _filehashes[os.path.abspath(filedir)] = [_stat.st_size, _stat.st_mtime_ns, _sha1.hexdigest(), ]
+    return _sha1.hexdigest()
+
+def save_filehashes():
+    '''Write the memoized file hashes, see file_fingerprint().
+    '''
+    if _filehashes is None:
+        return
+    os.makedirs(cachedir(), exist_ok=True, )
+    with open('{0}/filehashes.json.tmp'.format(cachedir()), 'w') as fo:
+        json.dump(_filehashes, fo, )
+    os.replace('{0}/filehashes.json.tmp'.format(cachedir()), '{0}/filehashes.json'.format(cachedir()), )
+
+def glob_files(patterns, rootdir, ):
+    '''Sorted files matched by the globs in patterns, relative to rootdir.
+    '''
+    files = []
+    for pattern in patterns:
+        files += glob.glob(os.path.join(rootdir, pattern, ))
+    return sorted(set([f for f in files if os.path.isfile(f)]))
+
+def fingerprint(step, branch, params, ):
+    '''Fingerprint of one branch of step: the code in the stage directory, the args and
+    the params (except nproc) and the input files.
+    '''
+    _stagedir = '{0}/{1}'.format(datasetsdir(), step['stage'], )
+    _inputs   = [p.format(**branch) for p in step['inputs']]
+    _files    = glob_files(_inputs, datasetsdir(), )
+
+    if len(_files) == 0 and len(_inputs) != 0:
+        raise ValueError('No inputs of {0}/{1} {2}: {3}'.format(step['stage'], step['name'], branch, _inputs, ))
+
+    _content = {
+        'args':   [a.format(**branch, nproc='-', nsplits=params['nsplits'], ) for a in step['args']],
+        'code':   {os.path.basename(f): file_fingerprint(f) for f in glob_files(['*.py', ], _stagedir, )},
+        'inputs': {os.path.relpath(f, datasetsdir(), ): file_fingerprint(f) for f in _files},
+    }
+    return hashlib.sha1(json.dumps(_content, sort_keys=True, ).encode()).hexdigest()
+
+def output_mtimes(outputs, stagedir, ):
+    '''{file relative to stagedir: mtime_ns} of the files matched by the globs in outputs.
+    '''
+    return {os.path.relpath(f, stagedir, ): os.stat(f).st_mtime_ns for f in glob_files(outputs, stagedir, )}
+
+def load_json(filedir, default, ):
+    '''Content of the json file filedir, default if absent.
+    '''
+    if not os.path.isfile(filedir):
+        return default
+    with open(filedir, 'r') as fi:
+        return json.load(fi)
+
+def save_json(filedir, content, ):
+    '''Write content to the json file filedir, through a temporary file.
+    '''
+    os.makedirs(os.path.dirname(filedir), exist_ok=True, )
+    with open('{0}.{1}.tmp'.format(filedir, os.getpid(), ), 'w') as fo:
+        json.dump(content, fo, )
+    os.replace('{0}.{1}.tmp'.format(filedir, os.getpid(), ), filedir, )
+
+def run_branch(step, branch, params, force=False, ):
+    '''Run one branch of step, or restore its outputs from the cache if the fingerprint is cached.
+    The cache entry {cachedir}/{stage}/{step}.{branch}.{fingerprint} holds copies of the outputs.
+    The fingerprint of a run in progress is kept in {stage}/.{step}.{branch}.running until it is cached,
+    with the mtimes of the outputs present before the run:
+    a relaunch of the same fingerprint resumes on the partial outputs, e.g., the manifests of mk_feats.
+    Only the outputs created by the pipeline, listed in {cachedir}/{stage}/{step}.{branch}.written.json, 
+    are removed on a change of the fingerprint: files present before the first run, e.g., tracked in git, 
+    are never removed, only overwritten by the step itself.
+    '''
+    _stagedir = '{0}/{1}'.format(datasetsdir(), step['stage'], )
+    _label    = '.'.join([step['name'], ] + [branch[k] for k in sorted(branch)])
+    _fp       = fingerprint(step, branch, params, )
+    _entry    = '{0}/{1}/{2}.{3}'.format(cachedir(), step['stage'], _label, _fp[:16], )
+    _outputs  = [p.format(**branch) for p in step['outputs']]
+    _running  = '{0}/.{1}.running'.format(_stagedir, _label, )
+    _written  = '{0}/{1}/{2}.written.json'.format(cachedir(), step['stage'], _label, )
+
+    # the outputs created by the pipeline: the recorded ones and these of an interrupted run.
+    _marker  = load_json(_running, None, )
+    _records = set(load_json(_written, [], ))
+    if not _marker is None:
+        _records |= set([f for f in output_mtimes(_outputs, _stagedir, ) if not f in _marker['preexisting']])
+
+    _cached = os.path.isfile('{0}/outputs.json'.format(_entry)) and not force
+
+    # outputs of other fingerprints are stale, e.g., the completion manifests of mk_feats.
+    if _cached or _marker is None or _marker['fingerprint'] != _fp or force:
+        for relfile in _records:
+            if os.path.isfile('{0}/{1}'.format(_stagedir, relfile)): os.remove('{0}/{1}'.format(_stagedir, relfile))
+        _records, _marker = set(), None
+        if os.path.isfile(_running): os.remove(_running)
+    save_json(_written, sorted(_records), )
+
+    if _cached:
+        _files = load_json('{0}/outputs.json'.format(_entry), [], )
+        _pre   = output_mtimes(_outputs, _stagedir, )
+        for relfile in _files:
+            os.makedirs(os.path.dirname('{0}/{1}'.format(_stagedir, relfile)), exist_ok=True, )
+            shutil.copy2('{0}/{1}'.format(_entry, relfile), '{0}/{1}'.format(_stagedir, relfile), )
+        save_json(_written, sorted([f for f in _files if not f in _pre]), )
+        report('{0}/{1}: cached {2}'.format(step['stage'], _label, _fp[:16]))
+        return _fp
+
+    _resumed = not _marker is None
+    if not _resumed:
+        _marker = {'fingerprint': _fp, 'preexisting': output_mtimes(_outputs, _stagedir, ), }
+        save_json(_running, _marker, )
+
+    # the stage scripts write into existing directories.
+    for pattern in _outputs:
+        os.makedirs(os.path.dirname('{0}/{1}'.format(_stagedir, pattern)), exist_ok=True, )
+
+    report('{0}/{1}: {2} {3}'.format(step['stage'], _label, 'resuming' if _resumed else 'running', _fp[:16]))
+    subprocess.run([sys.executable, ] + [a.format(**branch, **params) for a in step['args']], cwd=_stagedir, check=True, )
+
+    _files = [os.path.relpath(f, _stagedir, ) for f in glob_files(_outputs, _stagedir, )]
+    if len(_files) == 0:
+        raise ValueError('No outputs of {0}/{1}: {2}'.format(step['stage'], _label, _outputs, ))
+
+    # write the entry to a temporary directory first: concurrent runs may share the cache.
+    _tmp = '{0}.{1}.tmp'.format(_entry, os.getpid(), )
+    shutil.rmtree(_tmp, ignore_errors=True, )
+    for relfile in _files:
+        os.makedirs(os.path.dirname('{0}/{1}'.format(_tmp, relfile)), exist_ok=True, )
+        shutil.copy2('{0}/{1}'.format(_stagedir, relfile), '{0}/{1}'.format(_tmp, relfile), )
+    with open('{0}/outputs.json'.format(_tmp), 'w') as fo:
+        json.dump(_files, fo, )
+
+    shutil.rmtree(_entry, ignore_errors=True, )
+    os.replace(_tmp, _entry, )
+    save_json(_written, sorted(_records | set([f for f in output_mtimes(_outputs, _stagedir, ) if not f in _marker['preexisting']])), )
+    os.remove(_running)
+    report('{0}/{1}: done'.format(step['stage'], _label))
+    return _fp
+
+def run(stages=None, nproc=None, nsplits=0, force=False, ):
+    '''Run the steps of the stages in order (all stages if None), the branches of each step concurrently.
+    nproc:   number of processes of the parallel steps, all cores if None, shared by the concurrent branches of a step;
+    nsplits: number of random splits besides the original one, see 5.train_test_split/ds_split.py;
+    force:   rerun even if cached.
+    '''
+    try:
+        for step in steps(sampling_dir(), ):
+            if not stages is None and not step['stage'] in stages:
+                continue
+
+            # the branches run concurrently: each gets its share of the cores.
+            params = {'nproc': max(1, (nproc or len(os.sched_getaffinity(0))) // len(step['branches'])), 'nsplits': nsplits, }
+
+            with ThreadPoolExecutor(max_workers=len(step['branches']), ) as pool:
+                list(pool.map(lambda branch: run_branch(step, branch, params, force, ), step['branches'], ))
+    finally:
+        save_filehashes()
+
+if __name__ == '__main__':
+    # python pipeline.py [nproc] [nsplits] [stage ...] [--force]
+    _args  = [a for a in sys.argv[1:] if not a.startswith('--')]
+    _nums  = [int(a) for a in _args if a.isdigit()]
+    stages = [a.rstrip('/') for a in _args if not a.isdigit()]
+
+    run(stages if len(stages) != 0 else None,
+        _nums[0] if len(_nums) > 0 else None,
+        _nums[1] if len(_nums) > 1 else 0,
+        '--force' in sys.argv,
+    )
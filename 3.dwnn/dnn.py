@@ -2,7 +2,7 @@
 # Zilin Song, 23 AUG 2021
 # 
 
-import numpy, iomisc, sys
+import numpy, iomisc, tfdata, sys
 from tensorflow import keras
 from tensorflow.keras import layers, optimizers, regularizers, initializers
 
@@ -25,6 +25,12 @@ print('   x dim:', x.shape)
 print('xpoh dim:', xpoh.shape)
 print('   y dim:', y.shape)
 
+# input pipelines.
+ds_train = tfdata.make_dataset(x, y, batch_size=25, shuffle=True, )
+ds_pred  = tfdata.make_dataset(x, y, batch_size=1024, shuffle=False, )
+
+print('input steps/sec:', tfdata.input_rate(ds_train))
+
 # -------------------------
 # Model definition.
 # -------------------------
@@ -68,25 +74,24 @@ keras.utils.plot_model(model, to_file=f'{outdir}/model_architect.png', show_shap
 # Callbacks during training.
 cb_checkpoint = keras.callbacks.ModelCheckpoint(filepath='./{0}/model.chkpt_tf'.format(outdir, ), )
 cb_earlystopping = keras.callbacks.EarlyStopping(monitor='loss', patience=300, restore_best_weights=True, )
+cb_steprate = tfdata.StepRate()
 
 # fitting.
-history = model.fit(x=(x), 
-                    y=(y), 
-                    batch_size=25,
+history = model.fit(ds_train,                      # batch_size=25, shuffled every epoch, see tfdata.make_dataset();
                     epochs=300, 
-                    callbacks=[cb_checkpoint, cb_earlystopping, ],
-                    validation_split=0.,          
-                    shuffle=True,                  # shuffle='batch' produces shitty results: don't use;
+                    callbacks=[cb_checkpoint, cb_earlystopping, cb_steprate, ],
                     initial_epoch=0,               # previous epoch number.
 )
 
+print('train steps/sec:', cb_steprate.rate())
+
 # -------------------------
 # Metrics
 # -------------------------
 
-y_pred = model.predict(x)
+y_pred = model.predict(ds_pred)
 
-results = model.evaluate(x, y)
+results = model.evaluate(ds_pred)
 
 print("loss, mse, mae:", results)
 
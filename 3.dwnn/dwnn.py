@@ -2,50 +2,42 @@
 # Zilin Song, 23 AUG 2021
 # 
 
-import numpy, iomisc, sys
+import numpy, iomisc, tfdata, models, sys
 from tensorflow import keras
-from tensorflow.keras import layers, optimizers, regularizers, initializers
 
 # -------------------------
 # Preprocessing.
 # -------------------------
 ds_idx = int(sys.argv[1])       # which dataset.
 outdir = str(sys.argv[2])       # output directory
+pidinpt = str(sys.argv[3]) if len(sys.argv) > 3 else 'onehot'   # path id input: onehot, emb.
 
 # sanity check
 if ds_idx not in [0, 1, 2, 3, 4, 5]: raise ValueError('Bad ds_idx spec.\n')
+if pidinpt not in ['onehot', 'emb', ]: raise ValueError('Bad pidinpt spec.\n')
 
 sysnames  = ['toho_amp', 'toho_cex', 'toho_amp', 'toho_cex', 'both', 'both']
 pathnames = ['r1ae',     'r1ae',     'r2ae',     'r2ae',     'r1ae', 'r2ae']
 
 # Load ds
-x, xpoh, y = iomisc.load_ds(sysnames[ds_idx], pathnames[ds_idx])
+x, pid, y, npath = iomisc.load_ds_pid(sysnames[ds_idx], pathnames[ds_idx])
 
 print('   x dim:', x.shape)
-print('xpoh dim:', xpoh.shape)
+print('xpoh dim:', (pid.shape[0], npath))
 print('   y dim:', y.shape)
 
+# input pipelines: xpoh is expanded from pid per batch; the path embedding takes pid directly.
+_width   = npath if pidinpt == 'onehot' else None
+ds_train = tfdata.make_dataset(x, y, pid, _width, batch_size=25, shuffle=True, )
+ds_pred  = tfdata.make_dataset(x, y, pid, _width, batch_size=1024, shuffle=False, )
+
+print('input steps/sec:', tfdata.input_rate(ds_train))
+
 # -------------------------
 # Model definition.
 # -------------------------
-l_inpt_x = layers.Input(shape=(x.shape[1]))
-
-l_dens_1 = layers.Dense(256, activation='relu')(l_inpt_x)
-l_dens_1 = layers.Dropout(0.1)(l_dens_1)
-
-l_dens_2 = layers.Dense(256, activation='relu')(l_dens_1)
-l_dens_2 = layers.Dropout(0.1)(l_dens_2)
-
-l_dens_3 = layers.Dense(256, activation='relu')(l_dens_2)
-l_dens_3 = layers.Dropout(0.1)(l_dens_3)
-
-l_inpt_xpoh = layers.Input(shape=(xpoh.shape[1]))
-l_concat = layers.Concatenate()([l_dens_3, l_inpt_xpoh])
-
-l_dens_fin = layers.Dense(256+xpoh.shape[1], activation='relu')(l_concat)
-l_dens_fin = layers.Dropout(0.1)(l_dens_fin)
-
-l_outpt    = layers.Dense(1)(l_dens_fin)
+l_inpt_x, l_inpt_xpoh = models.dwnn_inputs(x.shape[1], npath, pidinpt, )
+l_outpt = models.dwnn_outputs(l_inpt_x, l_inpt_xpoh, npath, pidinpt, )
 
 # -------------------------
 # Model compile.
@@ -70,25 +62,24 @@ keras.utils.plot_model(model, to_file=f'{outdir}/model_architect.png', show_shap
 # Callbacks during training.
 cb_checkpoint = keras.callbacks.ModelCheckpoint(filepath='./{0}/model.chkpt_tf'.format(outdir, ), )
 cb_earlystopping = keras.callbacks.EarlyStopping(monitor='loss', patience=300, restore_best_weights=True)
+cb_steprate = tfdata.StepRate()
 
 # fitting.
-history = model.fit(x=(x, xpoh), 
-                    y=(y), 
-                    batch_size=25,
+history = model.fit(ds_train,                      # batch_size=25, shuffled every epoch, see tfdata.make_dataset();
                     epochs=300, 
-                    callbacks=[cb_checkpoint, cb_earlystopping, ],
-                    validation_split=0.,          
-                    shuffle=True,                  # shuffle='batch' produces shitty results: don't use;
+                    callbacks=[cb_checkpoint, cb_earlystopping, cb_steprate, ],
                     initial_epoch=0,               # previous epoch number.
 )
 
+print('train steps/sec:', cb_steprate.rate())
+
 # -------------------------
 # Metrics
 # -------------------------
 
-y_pred = model.predict((x, xpoh))
+y_pred = model.predict(ds_pred)
 
-results = model.evaluate((x, xpoh), y)
+results = model.evaluate(ds_pred)
 
 print("loss, mse, mae:", results)
 
@@ -0,0 +1,196 @@
+# Train the DWNNs of several datasets, packed into one model per nrows.
+# Zilin Song, 23 AUG 2021
+#
+
+import os, numpy, iomisc, sys, math, multiprocessing
+
+sysnames  = ['toho_amp', 'toho_cex', 'toho_amp', 'toho_cex', 'both', 'both']
+pathnames = ['r1ae',     'r1ae',     'r2ae',     'r2ae',     'r1ae', 'r2ae']
+
+_dss = None     # {ds_idx: (x, pid, y, npath), }, loaded once and shared by the forked workers.
+
+def load_all(ds_idxs, ):
+    '''Load each ds once.
+    return {ds_idx: (x, pid, y, npath), }
+    '''
+    return {i: iomisc.load_ds_pid(sysnames[i], pathnames[i]) for i in ds_idxs}
+
+def _init_worker(corequeue, ):
+    '''Pin the pool worker to its own cores and size the TF (oneDNN) thread pools to them,
+    such that the packed models fitted concurrently do not oversubscribe the node. TensorFlow is first imported here.
+    '''
+    cores = corequeue.get()
+    os.sched_setaffinity(0, cores, )
+    os.environ['OMP_NUM_THREADS'] = str(len(cores))
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(len(cores))
+    tf.config.threading.set_inter_op_parallelism_threads(2)
+
+def pack_datasets(dss, batch_size, shuffle, ):
+    '''Zip the input pipelines of the dss [(x, pid, y, npath), ] into batches of
+    ((x_0, xpoh_0, x_1, xpoh_1, ...), (y_0, y_1, ...)), see tfdata.make_dataset().
+    The dss must have the same number of rows: each is one pass per epoch.
+    '''
+    import tfdata, tensorflow as tf
+
+    if len(set([ds[0].shape[0] for ds in dss])) != 1: raise ValueError('Packed ds of different nrows.\n')
+
+    zipped = tf.data.Dataset.zip(tuple([tfdata.make_dataset(x, y, pid, npath, batch_size, shuffle, ) for x, pid, y, npath in dss]))
+    zipped = zipped.map(lambda *batches: (tuple([i for inpts, _y in batches for i in inpts]), tuple([_y for inpts, _y in batches])), )
+
+    return zipped.prefetch(tf.data.AUTOTUNE)
+
+def pack_models(dss, names, ):
+    '''One model of the DWNNs of the dss, side by side in one graph: a train step is one step of all DWNNs.
+    The loss is the sum of the mse of each DWNN, whose gradients w.r.t. each DWNN are the gradients
+    of the DWNN alone, with adam updating each weight independently.
+    return the packed model, [DWNN of each ds, ] sharing the weights of the packed model.
+    '''
+    import models
+    from tensorflow import keras
+
+    inpts, outpts, members = [], [], []
+
+    for (x, pid, y, npath), name in zip(dss, names):
+        l_inpt_x, l_inpt_xpoh = models.dwnn_inputs(x.shape[1], npath, name=name, )
+        l_outpt = models.dwnn_outputs(l_inpt_x, l_inpt_xpoh, npath, name=name, )
+
+        inpts  += [l_inpt_x, l_inpt_xpoh, ]
+        outpts += [l_outpt, ]
+        members.append(keras.Model(inputs=[l_inpt_x, l_inpt_xpoh], outputs=[l_outpt]))
+
+    packed = keras.Model(inputs=inpts, outputs=outpts)
+    packed.compile(
+        optimizer='adam',
+        loss=['mse', ]*len(dss),
+        metrics=[['mse', 'mae'], ]*len(dss),
+    )
+
+    for member in members:
+        member.compile(optimizer='adam', loss='mse', metrics=['mse', 'mae'], )
+
+    return packed, members
+
+def member_callbacks(members, names, outdirs, patience=300, ):
+    '''The callbacks of dwnn.py for each member of a packed model, on the member's own loss {name}outpt_loss:
+    the checkpoint of the member in its outdir every epoch;
+    the early stopping restoring the best weights of each member, stopping when all members run out of patience.
+    '''
+    from tensorflow import keras
+
+    class MemberCallbacks(keras.callbacks.Callback):
+
+        def on_train_begin(self, logs=None, ):
+            self.best    = [numpy.inf, ]*len(members)
+            self.weights = [None, ]*len(members)
+            self.wait    = [0, ]*len(members)
+
+        def on_epoch_end(self, epoch, logs=None, ):
+            for k, (member, name, outdir) in enumerate(zip(members, names, outdirs)):
+                member.save('./{0}/model.chkpt_tf'.format(outdir, ))
+
+                _loss = logs[f'{name}outpt_loss'] if len(members) > 1 else logs['loss']     # one output: loss only.
+                if _loss < self.best[k]:
+                    self.best[k], self.weights[k], self.wait[k] = _loss, member.get_weights(), 0
+                else:
+                    self.wait[k] += 1
+
+            if min(self.wait) >= patience:
+                self.model.stop_training = True
+
+        def on_train_end(self, logs=None, ):
+            for member, weights in zip(members, self.weights):
+                if not weights is None: member.set_weights(weights)
+
+    return MemberCallbacks()
+
+def fit_packed(packed, members, dss, names, outdirs, epochs=300, ):
+    '''Fit the packed model on the zipped dss, batch_size=25 for each ds.
+    '''
+    import tfdata
+
+    cb_members  = member_callbacks(members, names, outdirs, )
+    cb_steprate = tfdata.StepRate()
+
+    history = packed.fit(pack_datasets(dss, 25, True, ),
+                         epochs=epochs,
+                         callbacks=[cb_members, cb_steprate, ],
+                         initial_epoch=0,               # previous epoch number.
+                         verbose=2,
+    )
+
+    print(f'{names} train steps/sec:', cb_steprate.rate(), flush=True, )
+    return history
+
+def save_member(member, ds, outdir, ):
+    '''Predict, evaluate and save one DWNN as 3.dwnn/dwnn.py does.
+    '''
+    import tfdata
+
+    x, pid, y, npath = ds
+    ds_pred = tfdata.make_dataset(x, y, pid, npath, batch_size=1024, shuffle=False, )
+
+    y_pred = member.predict(ds_pred)
+    results = member.evaluate(ds_pred)
+
+    member.save(f'{outdir}/model.h5')
+    numpy.save(f'{outdir}/y_pred.npy', y_pred)
+
+    mse = numpy.square(numpy.asarray(y).flatten() - y_pred.flatten()).mean()
+    mae = numpy.abs(numpy.asarray(y).flatten() - y_pred.flatten()).mean()
+    print(f'{outdir}: loss, mse, mae: {results}\nmse:  {mse} \nrmse:  {math.sqrt(mse)}\nmae:  {mae}', flush=True, )
+
+def train_pack(args, ):
+    '''Build, fit and save one packed model of the ds_idxs in a pool worker.
+    '''
+    ds_idxs, outprefix, epochs = args
+
+    dss     = [_dss[i] for i in ds_idxs]
+    names   = [f'mod{i}_' for i in ds_idxs]
+    outdirs = [f'{outprefix}{i}' for i in ds_idxs]
+    for outdir in outdirs:
+        os.makedirs(outdir, exist_ok=True, )
+
+    packed, members = pack_models(dss, names, )
+    print(f'packed ds_idx {ds_idxs}: {dss[0][0].shape[0]} rows, {packed.count_params()} parameters.', flush=True, )
+
+    fit_packed(packed, members, dss, names, outdirs, epochs, )
+
+    for member, ds, outdir in zip(members, dss, outdirs):
+        save_member(member, ds, outdir, )
+
+def train_all(ds_idxs, outprefix, epochs=300, ):
+    '''Train the DWNNs of ds_idxs, one packed model per nrows (the toho_* ds and the both ds).
+    The packed models are fitted concurrently in forked workers, each pinned to its share of the cores.
+    The DWNN of ds_idx is saved in {outprefix}{ds_idx}.
+    '''
+    global _dss
+
+    # sanity check
+    if not set(ds_idxs) <= set([0, 1, 2, 3, 4, 5]): raise ValueError('Bad ds_idx spec.\n')
+
+    # Load ds: before the workers are forked.
+    _dss = load_all(ds_idxs)
+
+    groups = {}
+    for i in ds_idxs:
+        groups.setdefault(_dss[i][0].shape[0], []).append(i)
+
+    cores  = sorted(os.sched_getaffinity(0))
+    _share = max(1, len(cores) // len(groups))
+    _ctx   = multiprocessing.get_context('fork')
+    _queue = _ctx.Queue()
+    for g in range(len(groups)):
+        _queue.put(cores[g*_share:(g+1)*_share] or cores)
+
+    with _ctx.Pool(len(groups), initializer=_init_worker, initargs=(_queue, ), ) as pool:
+        pool.map(train_pack, [(idxs, outprefix, epochs, ) for idxs in groups.values()], chunksize=1, )
+
+if __name__ == '__main__':
+    # python dwnn_all.py outprefix [ds_idx ...]
+    # the DWNN of ds_idx is saved in {outprefix}{ds_idx}, e.g., cpu_mod0 ... cpu_mod5 as sh.dwnn.
+    outprefix = str(sys.argv[1])
+    ds_idxs   = [int(i) for i in sys.argv[2:]] if len(sys.argv) > 2 else [0, 1, 2, 3, 4, 5]
+
+    train_all(ds_idxs, outprefix, )
@@ -0,0 +1,111 @@
+# Deep ensemble of the DWNN, with the per-replica variance of the predictions.
+# Zilin Song, 23 AUG 2021
+# 
+
+import numpy, iomisc, tfdata, models, sys
+from tensorflow import keras
+
+# -------------------------
+# Preprocessing.
+# -------------------------
+ds_idx = int(sys.argv[1])       # which dataset.
+outdir = str(sys.argv[2])       # output directory: not the cpu_mod* of dwnn.py, e.g., cpu_ens*.
+nmembers = int(sys.argv[3]) if len(sys.argv) > 3 else 5             # ensemble size.
+pidinpt  = str(sys.argv[4]) if len(sys.argv) > 4 else 'onehot'      # path id input: onehot, emb.
+
+# sanity check
+if ds_idx not in [0, 1, 2, 3, 4, 5]: raise ValueError('Bad ds_idx spec.\n')
+if pidinpt not in ['onehot', 'emb', ]: raise ValueError('Bad pidinpt spec.\n')
+
+sysnames  = ['toho_amp', 'toho_cex', 'toho_amp', 'toho_cex', 'both', 'both']
+pathnames = ['r1ae',     'r1ae',     'r2ae',     'r2ae',     'r1ae', 'r2ae']
+
+# Load ds
+x, pid, y, npath = iomisc.load_ds_pid(sysnames[ds_idx], pathnames[ds_idx])
+
+print('   x dim:', x.shape)
+print('xpoh dim:', (pid.shape[0], npath))
+print('   y dim:', y.shape)
+
+# input pipelines: shared by all members.
+_width   = npath if pidinpt == 'onehot' else None
+ds_train = tfdata.make_dataset(x, y, pid, _width, batch_size=25, shuffle=True, )
+ds_pred  = tfdata.make_dataset(x, y, pid, _width, batch_size=1024, shuffle=False, )
+
+print('input steps/sec:', tfdata.input_rate(ds_train))
+
+# -------------------------
+# Model definition.
+# -------------------------
+l_inpt_x, l_inpt_xpoh = models.dwnn_inputs(x.shape[1], npath, pidinpt, )
+l_outpt_ens, l_outpt_mean = models.ensemble_outputs(l_inpt_x, l_inpt_xpoh, npath, nmembers, pidinpt, )
+
+# -------------------------
+# Model compile.
+# -------------------------
+
+# the mse of the (batch, nmembers) predictions against y of (batch, 1) is the mean of the member mse:
+# the gradients w.r.t. each member are these of the member alone, scaled by 1/nmembers (no effect on adam).
+model = keras.Model(inputs=[l_inpt_x, l_inpt_xpoh], outputs=[l_outpt_ens])
+
+model.compile(
+    optimizer='adam', 
+    loss='mse', 
+    metrics=['mse', 'mae']
+)
+
+model.summary()
+
+# the ensemble mean, a drop-in of the dwnn.py model for 4.bcig.
+model_mean = keras.Model(inputs=[l_inpt_x, l_inpt_xpoh], outputs=[l_outpt_mean])
+model_mean.compile(optimizer='adam', loss='mse', metrics=['mse', 'mae'], )
+
+# -------------------------
+# Model training.
+# -------------------------
+
+# Callbacks during training.
+cb_checkpoint = keras.callbacks.ModelCheckpoint(filepath='./{0}/model_ens.chkpt_tf'.format(outdir, ), )
+cb_earlystopping = keras.callbacks.EarlyStopping(monitor='loss', patience=300, restore_best_weights=True)
+cb_steprate = tfdata.StepRate()
+
+# fitting.
+history = model.fit(ds_train,                      # batch_size=25, shuffled every epoch, see tfdata.make_dataset();
+                    epochs=300, 
+                    callbacks=[cb_checkpoint, cb_earlystopping, cb_steprate, ],
+                    initial_epoch=0,               # previous epoch number.
+)
+
+print('train steps/sec:', cb_steprate.rate())
+
+# -------------------------
+# Metrics
+# -------------------------
+
+# all members in one pass.
+y_pred_ens = model.predict(ds_pred)
+y_pred     = numpy.mean(y_pred_ens, axis=1, keepdims=True, )
+
+results = model_mean.evaluate(ds_pred)
+
+print("ensemble mean loss, mse, mae:", results)
+
+model.save(f'{outdir}/model_ens.h5')
+model_mean.save(f'{outdir}/model_mean.h5')
+numpy.save(f'{outdir}/y_pred_ens.npy', y_pred_ens)
+numpy.save(f'{outdir}/y_pred_mean.npy', y_pred)
+
+y      = numpy.asarray(y).flatten()
+y_pred = y_pred.flatten()
+
+import math
+
+mse = numpy.square(y - y_pred).mean()
+rmse = math.sqrt(mse)
+print('mse: ', mse, '\nrmse: ', rmse)
+
+mae = numpy.abs(y-y_pred).mean()
+print('mae: ', mae)
+
+y_std = numpy.std(y_pred_ens, axis=1, ddof=1, )
+print('per-replica std, mean: ', y_std.mean(), '\nper-replica std, max: ', y_std.max())
@@ -2,7 +2,11 @@
 # Zilin Song, 23 AUG 2021
 # 
 
-import numpy
+import os, sys, numpy
+
+# the ds bundle reader of 2.datasets/4.conclude_ds, shared by the training stages.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../2.datasets/4.conclude_ds', ))
+from dsbundle import load_bundle, onehot
 
 def load_ds(sysname, pathname,):
     '''Load various normalized/rescaled datasets and the corresponding labels from 
@@ -11,16 +15,19 @@ def load_ds(sysname, pathname,):
     '''
     # directory settings.
     prefx    = '../2.datasets/4.conclude_ds/fin_ds'
-    xname    = 'x'
-    xpohanme = 'x_onehot'
-    yname    = 'y'
-
-    xdir     = f'{prefx}/{sysname}.{pathname}.{xname}.npy'
-    xpohdir  = f'{prefx}/{sysname}.{pathname}.{xpohanme}.npy'
-    ydir     = f'{prefx}/{sysname}.{pathname}.{yname}.npy'
+    ds, prov = load_bundle(f'{prefx}/{sysname}.{pathname}.ds')
 
-    x    = numpy.load(xdir)
-    xpoh = numpy.load(xpohdir)
-    y    = numpy.expand_dims(numpy.load(ydir), 1)
+    x    = ds['x']
+    xpoh = onehot(ds['pid'], prov['npath'])
+    y    = numpy.expand_dims(ds['y'], 1)
 
     return x, xpoh, y
+
+def load_ds_pid(sysname, pathname, ):
+    '''As load_ds() but with the path ids instead of the one-hot xpoh, see tfdata.make_dataset().
+    return x, pid, y, npath
+    '''
+    prefx    = '../2.datasets/4.conclude_ds/fin_ds'
+    ds, prov = load_bundle(f'{prefx}/{sysname}.{pathname}.ds')
+
+    return ds['x'], ds['pid'], numpy.expand_dims(ds['y'], 1), prov['npath']
@@ -0,0 +1,65 @@
+# Model definitions of the DWNN.
+# Zilin Song, 23 AUG 2021
+#
+
+from tensorflow.keras import layers
+
+def dwnn_inputs(nx, npath, pidinpt='onehot', name='', ):
+    '''Input layers of the DWNN: x, and the path id as
+    onehot: the one-hot xpoh of width npath;
+    emb:    the int path id, for the path embedding: a smaller model than onehot, not an equivalent one, see dwnn_outputs().
+    '''
+    l_inpt_x = layers.Input(shape=(nx, ), name=f'{name}x' if name else None, )
+
+    if pidinpt == 'onehot':
+        l_inpt_xpoh = layers.Input(shape=(npath, ), name=f'{name}xpoh' if name else None, )
+    elif pidinpt == 'emb':
+        l_inpt_xpoh = layers.Input(shape=(1, ), dtype='int32', name=f'{name}pid' if name else None, )
+    else:
+        raise ValueError('Bad pidinpt spec.\n')
+
+    return l_inpt_x, l_inpt_xpoh
+
+def dwnn_outputs(l_inpt_x, l_inpt_xpoh, npath, pidinpt='onehot', name='', ):
+    '''Output layer of the DWNN on the inputs of dwnn_inputs().
+    name:   prefix of the layer names, that distinguishes the models packed in one graph.
+    '''
+    _name = lambda layername: f'{name}{layername}' if name else None
+
+    l_dens_1 = layers.Dense(256, activation='relu', name=_name('dens_1'), )(l_inpt_x)
+    l_dens_1 = layers.Dropout(0.1, name=_name('drop_1'), )(l_dens_1)
+
+    l_dens_2 = layers.Dense(256, activation='relu', name=_name('dens_2'), )(l_dens_1)
+    l_dens_2 = layers.Dropout(0.1, name=_name('drop_2'), )(l_dens_2)
+
+    l_dens_3 = layers.Dense(256, activation='relu', name=_name('dens_3'), )(l_dens_2)
+    l_dens_3 = layers.Dropout(0.1, name=_name('drop_3'), )(l_dens_3)
+
+    if pidinpt == 'onehot':
+        l_concat = layers.Concatenate(name=_name('concat'), )([l_dens_3, l_inpt_xpoh])
+
+        l_dens_fin = layers.Dense(256+npath, activation='relu', name=_name('dens_fin'), )(l_concat)
+
+    else:
+        # the path embedding of fixed width 256 added to the final Dense(256), a lookup instead of a matmul with the one-hot.
+        # NOTE not equivalent to onehot, whose final layer is 256+npath wide: 
+        #      here only the embedding grows with npath (npath*256 parameters), the final layer and the FLOPs do not.
+        l_path_emb = layers.Flatten(name=_name('path_flat'), )(layers.Embedding(npath, 256, name=_name('path_emb'), )(l_inpt_xpoh))
+
+        l_dens_fin = layers.Dense(256, name=_name('dens_fin'), )(l_dens_3)
+        l_dens_fin = layers.Activation('relu', name=_name('relu_fin'), )(layers.Add(name=_name('add_fin'), )([l_dens_fin, l_path_emb]))
+
+    l_dens_fin = layers.Dropout(0.1, name=_name('drop_fin'), )(l_dens_fin)
+
+    return layers.Dense(1, name=_name('outpt'), )(l_dens_fin)
+
+def ensemble_outputs(l_inpt_x, l_inpt_xpoh, npath, nmembers, pidinpt='onehot', ):
+    '''Output layers of nmembers DWNNs on the same inputs, packed in one graph as a deep ensemble.
+    The members differ by their random initialization and dropout.
+    return the (batch, nmembers) predictions of the members, the (batch, 1) ensemble mean.
+    '''
+    if nmembers < 2: raise ValueError('An ensemble needs at least 2 members.\n')
+
+    l_outpts = [dwnn_outputs(l_inpt_x, l_inpt_xpoh, npath, pidinpt, name=f'ens{k}_', ) for k in range(nmembers)]
+
+    return layers.Concatenate(name='ens', )(l_outpts), layers.Average(name='ens_mean', )(l_outpts)
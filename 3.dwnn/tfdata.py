@@ -0,0 +1,73 @@
+# tf.data input pipelines for training/predicting from the fin_ds.
+# Zilin Song, 23 AUG 2021
+#
+
+import time, numpy, tensorflow as tf
+from tensorflow import keras
+
+def make_dataset(x, y, pid=None, npath=None, batch_size=25, shuffle=True, seed=None, ):
+    '''Batches of (x, y), or ((x, xpoh), y) if pid is given, from the arrays loaded by iomisc.load_ds_pid().
+    The rows are cast to float32 once and cached in memory;
+    shuffle:    reshuffle all rows every epoch, as model.fit(shuffle=True, );
+    pid:        path ids, expanded to the one-hot xpoh of width npath per batch;
+                or kept as the int32 ids of shape (batch_size, 1) if npath is None, for the path embedding of dwnn.py.
+    Batches are prefetched while the model trains on the previous one.
+    '''
+    _cols = (x, y, ) if pid is None else (x, y, pid, )
+    ds = tf.data.Dataset.from_tensor_slices(_cols)
+    ds = ds.map(lambda *cols: tuple([tf.cast(c, tf.float32) if c.dtype.is_floating else c for c in cols]))
+    ds = ds.cache()
+
+    if shuffle:
+        ds = ds.shuffle(x.shape[0], seed=seed, reshuffle_each_iteration=True, )
+
+    ds = ds.batch(batch_size)
+
+    if not pid is None and not npath is None:
+        ds = ds.map(lambda _x, _y, _pid: ((_x, tf.one_hot(_pid, npath, dtype=tf.float32, )), _y),
+                    num_parallel_calls=tf.data.AUTOTUNE, )
+
+    elif not pid is None:
+        ds = ds.map(lambda _x, _y, _pid: ((_x, tf.expand_dims(tf.cast(_pid, tf.int32), 1)), _y),
+                    num_parallel_calls=tf.data.AUTOTUNE, )
+
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+def input_rate(ds, nepochs=2, ):
+    '''Steps/sec of iterating ds alone, i.e., the maximum rate the input pipeline serves batches.
+    The first epoch fills the cache and is not timed.
+    '''
+    for _ in ds:
+        pass
+
+    nsteps = 0
+    t0 = time.perf_counter()
+    for _ in range(nepochs):
+        for _ in ds:
+            nsteps += 1
+
+    return nsteps / (time.perf_counter() - t0)
+
+class StepRate(keras.callbacks.Callback):
+    '''Steps/sec of model.fit() per epoch, logged as steps_per_sec in the history.
+    Training at a rate close to input_rate() is input-bound, far below is compute-bound.
+    '''
+    def on_train_begin(self, logs=None, ):
+        self.rates = []
+
+    def on_epoch_begin(self, epoch, logs=None, ):
+        self._nsteps = 0
+        self._t0 = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None, ):
+        self._nsteps += 1
+
+    def on_epoch_end(self, epoch, logs=None, ):
+        _rate = self._nsteps / (time.perf_counter() - self._t0)
+        self.rates.append(_rate)
+        if not logs is None: logs['steps_per_sec'] = _rate
+
+    def rate(self, ):
+        '''Mean steps/sec over the epochs, excluding the first (tracing) epoch if possible.
+        '''
+        return numpy.mean(self.rates[1:] if len(self.rates) > 1 else self.rates)
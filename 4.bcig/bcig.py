@@ -69,13 +69,14 @@ def get_gradient_along_path(x_path, xpoh_path, model, fg_mask, pert=0.01):
     # Perturbed x.
     x_dxm, x_dxp = x-d_xm_masked, x+d_xp_masked
 
-    # Predicted perturbed x.
-    f_x_dxm = numpy.squeeze( model.predict( (x_dxm, xpoh) ), axis=1)
-    f_x_dxp = numpy.squeeze( model.predict( (x_dxp, xpoh) ), axis=1)
-    # f_x     = numpy.squeeze( model.predict( (x,     xpoh) ), axis=1)
+    # Predicted perturbed x: (nrep-2, 1), or (nrep-2, nmembers) of an ensemble model.
+    f_x_dxm = model.predict( (x_dxm, xpoh) )
+    f_x_dxp = model.predict( (x_dxp, xpoh) )
+    # f_x     = model.predict( (x,     xpoh) )
 
     # Partial gradients with numpy.
     _grad = f_x_dxp - f_x_dxm
+    _grad = numpy.squeeze(_grad, axis=1) if _grad.shape[1] == 1 else _grad
     
     return _grad / 2. / pert
 
@@ -113,10 +114,16 @@ def gaussian_mixture_prob(arr, normalize=True):
     else: 
         return gmm_prob
 
-def compute_bcig(sysname, pathname, fg, ipath, nrep=50):
-    '''Compute the path-wise numerical gradients of npaths.'''
-    x, xpoh, y = iomisc.load_ds(sysname, pathname)
-    model = iomisc.load_model(sysname, pathname)
+def compute_bcig(sysname, pathname, fg, ipath, nrep=50, ens=False):
+    '''Compute the path-wise numerical gradients of npaths.
+    ens: with the deep ensemble of 3.dwnn/dwnn_ens.py, return the mean and the std of the bcig over the members.
+    '''
+    model = iomisc.load_model(sysname, pathname, ens)
+    if 'int' in str(model.inputs[1].dtype):  # path embedding model (3.dwnn/dwnn.py emb) takes the path ids.
+        x, pid, y, _ = iomisc.load_ds_pid(sysname, pathname)
+        xpoh = numpy.asarray(pid, dtype=numpy.int32, )[:, None]
+    else:
+        x, xpoh, y = iomisc.load_ds(sysname, pathname)
     fg_mask = get_fgmask(fg, pathname, x[0])[0]
     fg_gradients = []
 
@@ -131,7 +138,8 @@ def compute_bcig(sysname, pathname, fg, ipath, nrep=50):
     cummulative_integrads = numpy.sum(numpy.abs(numpy.cumsum(fg_gradients, axis=1)), axis=1) \
                           + numpy.abs(numpy.sum(fg_gradients, axis=1))  # sum through path to include the contribution of acyl-enzyme (last replica)
 
-    barriers = iomisc.load_pred_barriers(sysname, pathname)[ipath]
+    barriers = iomisc.load_pred_barriers(sysname, pathname)[ipath] if not ens else \
+               iomisc.load_pred_barriers_ens(sysname, pathname)[0][ipath]  # the ensemble mean.
 
     # toho/cex:r2ae split measurement 
     ds_idx = numpy.where(barriers < 32) 
@@ -143,8 +151,8 @@ def compute_bcig(sysname, pathname, fg, ipath, nrep=50):
     gauss_prob = 1 # gaussian_mixture_prob(barriers)
     bolzm_prob = 1 # boltzmann_prob(barriers)
 
-    bcig = numpy.sum(cummulative_integrads * gauss_prob * bolzm_prob)
-    return bcig
+    bcig = numpy.sum(cummulative_integrads * gauss_prob * bolzm_prob, axis=0)     # (nmembers, ) if ens.
+    return bcig if not ens else (numpy.mean(bcig), numpy.std(bcig, ddof=1))
 
 def fg_bcig(sysname, pathname, npath):
     """Perform bootstrapping on bcig convergence tests."""
@@ -2,7 +2,11 @@
 # Zilin Song, 21 AUG 2021
 # 
 
-import numpy
+import os, sys, numpy
+
+# the ds bundle reader of 2.datasets/4.conclude_ds, shared by the training stages.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../2.datasets/4.conclude_ds', ))
+from dsbundle import load_bundle, onehot
 
 def load_ds(sysname, pathname):
     '''Load various normalized/rescaled datasets and the corresponding labels from 
@@ -11,23 +15,26 @@ def load_ds(sysname, pathname):
     '''
     # directory settings.
     prefx    = '/users/zilins/scratch/2.proj_toho2lig_acy/2.datasets/4.conclude_ds/fin_ds'
-    xname    = 'x'
-    xpohanme = 'x_onehot'
-    yname    = 'y'
-    xlblname = 'xlbl'
-
-    xdir     = f'{prefx}/{sysname}.{pathname}.{xname}.npy'
-    xpohdir  = f'{prefx}/{sysname}.{pathname}.{xpohanme}.npy'
-    ydir     = f'{prefx}/{sysname}.{pathname}.{yname}.npy'
-
-    x    = numpy.load(xdir)
-    xpoh = numpy.load(xpohdir)
-    y    = numpy.expand_dims(numpy.load(ydir), 1)
+    ds, prov = load_bundle(f'{prefx}/{sysname}.{pathname}.ds')
+
+    x    = ds['x']
+    xpoh = onehot(ds['pid'], prov['npath'])
+    y    = numpy.expand_dims(ds['y'], 1)
     
     return x, xpoh, y
 
-def load_model(sysname, pathname):
+def load_ds_pid(sysname, pathname, ):
+    '''As load_ds() but with the path ids instead of the one-hot xpoh, for the path embedding models.
+    return x, pid, y, npath
+    '''
+    prefx    = '/users/zilins/scratch/2.proj_toho2lig_acy/2.datasets/4.conclude_ds/fin_ds'
+    ds, prov = load_bundle(f'{prefx}/{sysname}.{pathname}.ds')
+
+    return ds['x'], ds['pid'], numpy.expand_dims(ds['y'], 1), prov['npath']
+
+def load_model(sysname, pathname, ens=False, ):
     '''Load the trained machine learning models
+    ens:    the deep ensemble of 3.dwnn/dwnn_ens.py predicting (nrows, nmembers) instead of the (ensemble mean) model.
     '''
     from tensorflow import keras
     tag = 0 if sysname == 'toho_amp' and pathname == 'r1ae' else \
@@ -38,11 +45,21 @@ def load_model(sysname, pathname):
           5 if sysname == 'both'     and pathname == 'r2ae' else \
           None
 
-    moddir = f'/users/zilins/scratch/2.proj_toho2lig_acy/3.dwnn/cpu_mod{tag}/model.h5'
+    moddir = f'/users/zilins/scratch/2.proj_toho2lig_acy/3.dwnn/cpu_ens{tag}/model_ens.h5' if ens else \
+             f'/users/zilins/scratch/2.proj_toho2lig_acy/3.dwnn/cpu_mod{tag}/model.h5'
     mod = keras.models.load_model(moddir)
 
     return mod
 
+def path_barriers(ypred, nrep=50, ):
+    '''Barriers of the paths of nrep replicas: the max energy of each path relative to its first replica.
+    ypred:  (nrows, ) or (nrows, nmembers) of an ensemble;
+    return  (npath, ) or (npath, nmembers).
+    '''
+    ypred_paths = numpy.reshape(ypred, (-1, nrep, ) + numpy.shape(ypred)[1:])
+
+    return numpy.max(ypred_paths - ypred_paths[:, 0:1, ...], axis=1, )
+
 def load_pred_barriers(sysname, pathname):
 
     tag = 0 if sysname == 'toho_amp' and pathname == 'r1ae' else \
@@ -56,19 +73,30 @@ def load_pred_barriers(sysname, pathname):
     ypreddir = f'/users/zilins/scratch/2.proj_toho2lig_acy/3.dwnn/cpu_mod{tag}/y_pred.npy'
     ypred = numpy.load(ypreddir)
 
-    ypred_paths = numpy.reshape(ypred, (-1, 50))
-    ypred_barrier = []
-    for pid in range(ypred_paths.shape[0]):
-        barrier = -999.
-
-        for repid in range(ypred_paths.shape[1]):
-            delta_ener = ypred_paths[pid][repid] - ypred_paths[pid][0]
-            if delta_ener >= barrier:
-                barrier = delta_ener
-        
-        ypred_barrier.append(barrier)
-    
-    return numpy.asarray(ypred_barrier)
+    return path_barriers(ypred.flatten())
+
+def load_pred_ens(sysname, pathname):
+    '''Load the predictions of the deep ensemble of 3.dwnn/dwnn_ens.py.
+    return (nrows, nmembers) predictions of the members.
+    '''
+    tag = 0 if sysname == 'toho_amp' and pathname == 'r1ae' else \
+          1 if sysname == 'toho_cex' and pathname == 'r1ae' else \
+          2 if sysname == 'toho_amp' and pathname == 'r2ae' else \
+          3 if sysname == 'toho_cex' and pathname == 'r2ae' else \
+          4 if sysname == 'both'     and pathname == 'r1ae' else \
+          5 if sysname == 'both'     and pathname == 'r2ae' else \
+          None
+
+    ypreddir = f'/users/zilins/scratch/2.proj_toho2lig_acy/3.dwnn/cpu_ens{tag}/y_pred_ens.npy'
+    return numpy.load(ypreddir)
+
+def load_pred_barriers_ens(sysname, pathname):
+    '''Barriers with error bars from the deep ensemble: the barriers of each member, see path_barriers().
+    return the mean and the std of the barriers over the members, both (npath, ).
+    '''
+    barriers = path_barriers(load_pred_ens(sysname, pathname))
+
+    return numpy.mean(barriers, axis=1, ), numpy.std(barriers, axis=1, ddof=1, )
 
 def load_grad(sysname, pathname, fgname):
     '''Load the computed gradient.
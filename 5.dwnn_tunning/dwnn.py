@@ -2,120 +2,188 @@
 # Zilin Song
 # 
 
-import numpy, iomisc, sys
-from tensorflow import keras
-from tensorflow.keras import layers
+import os, sys, math, time, numpy, iomisc, multiprocessing
 
-# -------------------------
-# Preprocessing.
-# -------------------------
-outdir   =   str(sys.argv[1])       # output directory
-ds_idx   =   int(sys.argv[2])       # which dataset.
+sysnames  = ['toho_amp', 'toho_cex', 'toho_amp', 'toho_cex', 'both', 'both']
+pathnames = ['r1ae',     'r1ae',     'r2ae',     'r2ae',     'r1ae', 'r2ae']
 
-def test(ds_idx, do_rate, n_units):
+_ds = None      # (xtrain, xpohtrain, ytrain, xval, xpohval, yval, xtest, xpohtest, ytest), loaded once and shared by the forked workers.
 
-    # sanity check
-    if ds_idx not in [0, 1, 2, 3, 4, 5]: raise ValueError('Bad ds_idx spec.\n')
+def _init_worker(corequeue, ):
+    '''Pin the pool worker to its own cores and size the TF (oneDNN) thread pools to them,
+    such that the workers do not oversubscribe the node. TensorFlow is first imported here.
+    '''
+    cores = corequeue.get()
+    os.sched_setaffinity(0, cores, )
+    os.environ['OMP_NUM_THREADS'] = str(len(cores))
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(len(cores))
+    tf.config.threading.set_inter_op_parallelism_threads(1)
 
-    sysnames  = ['toho_amp', 'toho_cex', 'toho_amp', 'toho_cex', 'both', 'both']
-    pathnames = ['r1ae',     'r1ae',     'r2ae',     'r2ae',     'r1ae', 'r2ae']
+def split_val(xtrain, xpohtrain, ytrain, val_frac=0.1, seed=0, ):
+    '''Hold out a seeded val_frac of the train rows as the validation set of the sweep, 
+    such that the grid points are ranked without seeing the test set.
+    return xtrain, xpohtrain, ytrain, xval, xpohval, yval
+    '''
+    val_ids   = numpy.random.default_rng(seed).permutation(xtrain.shape[0])[:int(round(val_frac*xtrain.shape[0]))]
+    _is_train = numpy.ones(xtrain.shape[0], dtype=bool, )
+    _is_train[val_ids] = False
 
-    # Load ds
-    xtrain, xpohtrain, ytrain, xtest, xpohtest, ytest= iomisc.load_ds(sysnames[ds_idx], pathnames[ds_idx])
+    return xtrain[_is_train], xpohtrain[_is_train], ytrain[_is_train], xtrain[val_ids], xpohtrain[val_ids], ytrain[val_ids]
 
-    print('   xtrain dim:', xtrain.shape)
-    print('xpohtrain dim:', xpohtrain.shape)
-    print('   ytrain dim:', ytrain.shape)
+def build_model(nx, npoh, do_rate, n_units, ):
+    '''The DWNN of 3.dwnn/dwnn.py with n_units per layer and dropout rate do_rate.
+    '''
+    from tensorflow import keras
+    from tensorflow.keras import layers
 
-    # -------------------------
-    # Model definition.
-    # -------------------------
-    l_inpt_x = layers.Input(shape=(xtrain.shape[1]))
+    l_inpt_x = layers.Input(shape=(nx, ))
 
     l_dens_1 = layers.Dense(n_units, activation='relu')(l_inpt_x)
-    l_dens_1 = layers.Dropout(0.1)(l_dens_1)
+    l_dens_1 = layers.Dropout(do_rate)(l_dens_1)
 
     l_dens_2 = layers.Dense(n_units, activation='relu')(l_dens_1)
-    l_dens_2 = layers.Dropout(0.1)(l_dens_2)
+    l_dens_2 = layers.Dropout(do_rate)(l_dens_2)
 
     l_dens_3 = layers.Dense(n_units, activation='relu')(l_dens_2)
-    l_dens_3 = layers.Dropout(0.1)(l_dens_3)
+    l_dens_3 = layers.Dropout(do_rate)(l_dens_3)
 
-    l_inpt_xpoh = layers.Input(shape=(xpohtrain.shape[1]))
+    l_inpt_xpoh = layers.Input(shape=(npoh, ))
     l_concat = layers.Concatenate()([l_dens_3, l_inpt_xpoh])
 
-    l_dens_fin = layers.Dense(n_units+xpohtrain.shape[1], activation='relu')(l_concat)
-    l_dens_fin = layers.Dropout(0.1)(l_dens_fin)
+    l_dens_fin = layers.Dense(n_units+npoh, activation='relu')(l_concat)
+    l_dens_fin = layers.Dropout(do_rate)(l_dens_fin)
 
     l_outpt    = layers.Dense(1)(l_dens_fin)
 
-    # -------------------------
-    # Model compile.
-    # -------------------------
-
-    # model = keras.Model(inputs=[l_inpt_rcrr, l_inpt_y2], outputs=[ly_outp])
     model = keras.Model(inputs=[l_inpt_x, l_inpt_xpoh], outputs=[l_outpt])
-
     model.compile(
-        optimizer='adam', 
-        loss='mse', 
+        optimizer='adam',
+        loss='mse',
         metrics=['mse', 'mae']
     )
 
-    model.summary()
+    return model
+
+def metrics(model, x, xpoh, y, ):
+    '''mse, rmse, mae of the model predictions on (x, xpoh) against y.
+    '''
+    ypred = model.predict((x, xpoh), batch_size=1024, verbose=0, ).flatten()
+    mse   = numpy.square(y.flatten() - ypred).mean()
 
-    # -------------------------
-    # Model training.
-    # -------------------------
+    return mse, math.sqrt(mse), numpy.abs(y.flatten() - ypred).mean()
+
+def train(args, ):
+    '''Train one grid point (do_rate, n_units) from epoch epoch0 to epoch1 in a pool worker,
+    resumed from its model saved in moddir if epoch0 > 0.
+    return a row of the results table, see sweep().
+    '''
+    do_rate, n_units, epoch0, epoch1, moddir = args
+    from tensorflow import keras
+
+    xtrain, xpohtrain, ytrain, xval, xpohval, yval, xtest, xpohtest, ytest = _ds
+    _moddir = f'{moddir}/do{do_rate}.nu{n_units}.h5'
+    _t0     = time.perf_counter()
+
+    model = build_model(xtrain.shape[1], xpohtrain.shape[1], do_rate, n_units, ) if epoch0 == 0 else \
+            keras.models.load_model(_moddir)
 
     # Callbacks during training.
-    cb_checkpoint = keras.callbacks.ModelCheckpoint(filepath='./{0}/model.chkpt_tf'.format(outdir, ), )
     cb_earlystopping = keras.callbacks.EarlyStopping(monitor='loss', patience=300, restore_best_weights=True, )
 
     # fitting.
-    history = model.fit(x=(xtrain, xpohtrain), 
-                        y=(ytrain), 
-                        batch_size=25,
-                        epochs=300, 
-                        callbacks=[cb_checkpoint, cb_earlystopping, ],
-                        validation_split=0.,          
-                        shuffle=True,                  # shuffle='batch' produces shitty results: don't use;
-                        initial_epoch=0,               # previous epoch number.
+    model.fit(x=(xtrain, xpohtrain),
+              y=(ytrain),
+              batch_size=25,
+              epochs=epoch1,
+              callbacks=[cb_earlystopping, ],
+              shuffle=True,                  # shuffle='batch' produces shitty results: don't use;
+              initial_epoch=epoch0,          # previous epoch number.
+              verbose=0,
     )
+    model.save(_moddir)
+
+    return (do_rate, n_units, epoch1, ) + metrics(model, xval, xpohval, yval, ) \
+                                        + metrics(model, xtest, xpohtest, ytest, ) \
+                                        + metrics(model, xtrain, xpohtrain, ytrain, ) \
+                                        + (time.perf_counter() - _t0, )
+
+def rungs(max_epochs, min_epochs=None, eta=3, ):
+    '''Epochs trained by the end of each rung of the successive halving:
+    min_epochs*eta**i below max_epochs, then max_epochs. One rung of max_epochs if min_epochs is None.
+    '''
+    epochs = []
+    while not min_epochs is None and min_epochs < max_epochs:
+        epochs.append(min_epochs)
+        min_epochs *= eta
+
+    return epochs + [max_epochs, ]
+
+def sweep(ds_idx, outdir, do_rates, n_units, nthreads=4, max_epochs=300, min_epochs=None, eta=3, ):
+    '''Train the (do_rate, n_units) grid of ds_idx concurrently, nthreads cores per worker.
+    Successive halving if min_epochs is given: after each rung, see rungs(), only the best 1/eta of
+    the grid points by val mse are trained further; all grid points are trained max_epochs otherwise.
+    The val set is held out of the train set, see split_val(): the test metrics are reported only.
+    Each rung of each grid point is a row of the results table
+        {outdir}/sweep.dat
+    see load_sweep().
+    '''
+    global _ds
+
+    # sanity check
+    if ds_idx not in [0, 1, 2, 3, 4, 5]: raise ValueError('Bad ds_idx spec.\n')
 
-    # -------------------------
-    # Metrics
-    # -------------------------
-
-    ypred = model.predict((xtest, xpohtest))
-
-    results = model.evaluate((xtest, xpohtest), ytest)
-
-    print("loss, mse, mae:", results)
-
-    ytest = ytest.flatten()
-    ypred = ypred.flatten()
-
-    import math
-
-    test_mse  = numpy.square(ytest - ypred).mean()
-    test_rmse = math.sqrt(test_mse)
-    test_mae  = numpy.abs(ytest - ypred).mean()
-    
-    ypred = model.predict((xtrain, xpohtrain))
-    results = model.evaluate((xtrain, xpohtrain), ytrain) 
-    
-    ytrain = ytrain.flatten()
-    ypred = ypred.flatten()
-    
-    train_mse  = numpy.square(ytrain - ypred).mean()
-    train_rmse = math.sqrt(train_mse)
-    train_mae  = numpy.abs(ytrain - ypred).mean()
-
-    with open(f'{outdir}/performance.log', 'a') as fo:
-        fo.write(f'nlay = {n_units}\tdo_rate={do_rate}\ttest_mse: {test_mse:10.4f}\ttest_rmse: {test_rmse:10.4f}\ttest_mae: {test_mae:10.4f}\t')
-        fo.write(f'train_mse: {train_mse:10.4f}\ttrain_rmse: {train_rmse:10.4f}\ttrain_mae: {train_mae:10.4f}\n')
-    
-for do_rate in [0., 0.1, 0.2, 0.3, 0.4]:
-    for n_units in [64, 128, 256, 512]:
-        test(ds_idx, do_rate, n_units)
+    # Load ds: before the workers are forked.
+    _ds = iomisc.load_ds(sysnames[ds_idx], pathnames[ds_idx])
+    _ds = split_val(*_ds[:3]) + _ds[3:]
+
+    print('   xtrain dim:', _ds[0].shape)
+    print('xpohtrain dim:', _ds[1].shape)
+    print('   ytrain dim:', _ds[2].shape)
+    print('     xval dim:', _ds[3].shape)
+
+    moddir = f'{outdir}/sweep_models'
+    os.makedirs(moddir, exist_ok=True, )
+
+    cores    = sorted(os.sched_getaffinity(0))
+    nworkers = max(1, min(len(cores) // nthreads, len(do_rates) * len(n_units), ))
+    _ctx     = multiprocessing.get_context('fork')
+    _queue   = _ctx.Queue()
+    for w in range(nworkers):
+        _queue.put(cores[w*nthreads:(w+1)*nthreads] or cores)
+
+    grid   = [(d, n, ) for d in do_rates for n in n_units]
+    epoch0 = 0
+
+    with open(f'{outdir}/sweep.dat', 'w') as fo, \
+         _ctx.Pool(nworkers, initializer=_init_worker, initargs=(_queue, ), ) as pool:
+        fo.write('#rung\tdo_rate\tn_units\tepochs\tval_mse\tval_rmse\tval_mae\ttest_mse\ttest_rmse\ttest_mae\ttrain_mse\ttrain_rmse\ttrain_mae\tsec\n')
+
+        for r, epoch1 in enumerate(rungs(max_epochs, min_epochs, eta, )):
+            rows = pool.map(train, [(d, n, epoch0, epoch1, moddir, ) for d, n in grid], chunksize=1, )
+
+            for row in rows:
+                fo.write('{0}\t{1}\t{2}\t{3}\t{4:.4f}\t{5:.4f}\t{6:.4f}\t{7:.4f}\t{8:.4f}\t{9:.4f}\t{10:.4f}\t{11:.4f}\t{12:.4f}\t{13:.1f}\n'.format(r, *row))
+            fo.flush()
+            print(f'rung {r}: {len(grid)} grid points trained to {epoch1} epochs.', flush=True, )
+
+            # the best 1/eta by val mse proceed to the next rung.
+            rows   = sorted(rows, key=lambda row: row[3], )
+            grid   = [(row[0], row[1], ) for row in rows[:max(1, math.ceil(len(rows) / eta))]]
+            epoch0 = epoch1
+
+def load_sweep(outdir, ):
+    '''Load the results table of sweep() as a structured array,
+    fields: rung, do_rate, n_units, epochs, val_mse, val_rmse, val_mae, test_mse, test_rmse, test_mae, train_mse, train_rmse, train_mae, sec.
+    '''
+    return numpy.genfromtxt(f'{outdir}/sweep.dat', delimiter='\t', names=True, )
+
+if __name__ == '__main__':
+    # python dwnn.py outdir ds_idx [nthreads] [min_epochs]
+    outdir   =   str(sys.argv[1])       # output directory
+    ds_idx   =   int(sys.argv[2])       # which dataset.
+    nthreads =   int(sys.argv[3]) if len(sys.argv) > 3 else 4           # cores per worker.
+    min_ep   =   int(sys.argv[4]) if len(sys.argv) > 4 else None        # successive halving from min_ep epochs.
+
+    sweep(ds_idx, outdir, [0., 0.1, 0.2, 0.3, 0.4], [64, 128, 256, 512], nthreads, 300, min_ep, )
@@ -2,38 +2,45 @@
 # Zilin Song, 21 AUG 2021
 # 
 
-import numpy
+import os, sys, numpy
 
-def load_ds(sysname, pathname,):
-    '''Load various normalized/rescaled datasets and the corresponding labels from 
-    sysname:    toho_amp, toho_cex;
-    pathname:   r1ae, r2ae;
+# the ds bundle reader of 2.datasets/4.conclude_ds, shared by the training stages.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../2.datasets/4.conclude_ds', ))
+from dsbundle import load_bundle, onehot
+
+def load_split(splitname, nrows, ):
+    '''Load the split manifest, see 2.datasets/5.train_test_split/ds_split.py.
+    nrows:  number of replicas in the ds, all except the test ids are for training.
+    return train_ids, test_ids
     '''
-    # directory settings.
     prefx    = '/users/zilins/scratch/2.proj_toho2lig_acy/2.datasets/5.train_test_split/fin_ds'
+    manifest = numpy.load(f'{prefx}/{splitname}.split.npz')
 
-    xtrain_name    = 'x_train'
-    xpohtrain_anme = 'x_onehot_train'
-    ytrain_name    = 'y_train'
+    test_ids  = manifest['test_ids']
+    train_ids = numpy.delete(numpy.arange(nrows), test_ids, )
 
-    xtest_name    = 'x_test'
-    xpohtest_anme = 'x_onehot_test'
-    ytest_name    = 'y_test'
+    return train_ids, test_ids
 
-    xtrain_dir    = f'{prefx}/{sysname}.{pathname}.{xtrain_name}.npy'
-    xpohtrain_dir = f'{prefx}/{sysname}.{pathname}.{xpohtrain_anme}.npy'
-    ytrain_dir    = f'{prefx}/{sysname}.{pathname}.{ytrain_name}.npy'
+def load_ds(sysname, pathname, splitname='split0', ):
+    '''Load various normalized/rescaled datasets and the corresponding labels from 
+    sysname:    toho_amp, toho_cex;
+    pathname:   r1ae, r2ae;
+    splitname:  the split manifest, see load_split().
+    The train/test sets are read from the memory-mapped concluded ds by the split ids.
+    '''
+    # directory settings.
+    prefx    = '/users/zilins/scratch/2.proj_toho2lig_acy/2.datasets/4.conclude_ds/fin_ds'
+    ds, prov = load_bundle(f'{prefx}/{sysname}.{pathname}.ds')
 
-    xtest_dir     = f'{prefx}/{sysname}.{pathname}.{xtest_name}.npy'
-    xpohtest_dir  = f'{prefx}/{sysname}.{pathname}.{xpohtest_anme}.npy'
-    ytest_dir     = f'{prefx}/{sysname}.{pathname}.{ytest_name}.npy'
+    x, pid, y = ds['x'], ds['pid'], ds['y']
+    train_ids, test_ids = load_split(splitname, x.shape[0])
 
-    xtrain    = numpy.load(xtrain_dir)
-    xpohtrain = numpy.load(xpohtrain_dir)
-    ytrain    = numpy.load(ytrain_dir)
+    xtrain    = x[train_ids]
+    xpohtrain = onehot(pid[train_ids], prov['npath'])
+    ytrain    = y[train_ids]
 
-    xtest    = numpy.load(xtest_dir)
-    xpohtest = numpy.load(xpohtest_dir)
-    ytest    = numpy.load(ytest_dir)
+    xtest    = x[test_ids]
+    xpohtest = onehot(pid[test_ids], prov['npath'])
+    ytest    = y[test_ids]
 
-    return xtrain, xpohtrain, ytrain, xtest, xpohtest, ytest
\ No newline at end of file
+    return xtrain, xpohtrain, ytrain, xtest, xpohtest, ytest
@@ -115,8 +115,12 @@ def gaussian_mixture_prob(arr, normalize=True):
 
 def compute_bcig(sysname, pathname, fg, ipath, nrep=50):
     '''Compute the path-wise numerical gradients of npaths selected with numpy.rand.'''
-    x, xpoh, y = iomisc.load_ds(sysname, pathname)
     model = iomisc.load_model(sysname, pathname)
+    if 'int' in str(model.inputs[1].dtype):  # path embedding model (3.dwnn/dwnn.py emb) takes the path ids.
+        x, pid, y, _ = iomisc.load_ds_pid(sysname, pathname)
+        xpoh = numpy.asarray(pid, dtype=numpy.int32, )[:, None]
+    else:
+        x, xpoh, y = iomisc.load_ds(sysname, pathname)
     fg_mask = get_fgmask(fg, pathname, x[0])[0]
     fg_gradients = []
 